@@ -0,0 +1,234 @@
+#!/usr/bin/python3
+"""
+    Benchmarks of the cold start of the interface and of the headless tools
+
+    Each target (import of the interface, help of the command line tool, ...)
+    is run in new Python processes. The durations and peak memory of these
+    processes are compared with a stored baseline, and the exit status is 1 if
+    some of them regressed or if a target loaded a module which should only be
+    imported on first use (scipy, yaml, ...).
+
+    With --profile, the import time of each module loaded by the targets is
+    reported instead (see python -X importtime).
+"""
+
+##########################################
+## Imports
+#
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+from common import ROOT_DIR, add_baseline_arguments, report
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_startup.json')
+LAZY_MODULES = ['scipy', 'yaml', 'multiprocessing', 'tkinter.filedialog']  # imported on first use
+RESULT_MARKER = 'STARTUP_RESULT '  # prefix of the line written by the probe of a process
+
+# Code run by each target, and the modules it shouldn't load
+TARGETS = OrderedDict([
+    ('python', ("pass", [])),
+    ('gui_import', ("import track_builder_gui", LAZY_MODULES)),
+    ('cli_help', (
+        "import runpy, sys\n"
+        "sys.argv = ['track_builder_cli.py', '--help']\n"
+        "runpy.run_path('track_builder_cli.py', run_name='__main__')",
+        LAZY_MODULES + ['numpy']
+    )),
+    ('headless_import', ("import src.headless", LAZY_MODULES)),
+    ('track_builder_import', ("import src.track_builder", LAZY_MODULES)),
+    ('track_exporter_import', ("import src.track_exporter", LAZY_MODULES)),
+])
+
+# Code run after a target, in the process measuring its memory
+PROBE = """
+def _report_startup():
+    import json, sys, tracemalloc
+    modules = sorted(sys.modules)
+    print({!r} + json.dumps({{'peak_memory': tracemalloc.get_traced_memory()[1], 'modules': modules}}))
+
+import atexit
+atexit.register(_report_startup)
+""".format(RESULT_MARKER)
+
+
+##########################################
+## Measurements
+#
+def run_process(code, options=()):
+    """ Runs Python code in a new process, from the root of the package
+
+        @param code: Code to run
+        @param options: Options of the interpreter
+        @return: [duration, stdout, stderr] -> duration (in s) of the process
+    """
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable] + list(options) + ['-c', code], cwd=ROOT_DIR,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+    )
+    duration = time.perf_counter() - start
+
+    if process.returncode != 0:
+        raise RuntimeError("the process failed:\n" + process.stderr)
+
+    return duration, process.stdout, process.stderr
+
+
+def measure_startup(code, repeat, budget):
+    """ Measures the duration and the peak memory of a new process
+
+        The memory and loaded modules are measured by an additional process,
+        since tracing the allocations slows the start down.
+
+        @param code: Code run by the process
+        @param repeat: Maximum number of timed runs
+        @param budget: Time (in s) after which no new run is started
+        @return: Dictionary of the measurements
+            - 'time' -> shortest duration of the process (in s)
+            - 'runs' -> number of timed runs
+            - 'peak_memory' -> peak of memory allocated by Python (in bytes)
+            - 'modules' -> names of the loaded modules
+    """
+    durations = []
+    start = time.perf_counter()
+
+    while len(durations) < repeat and (not durations or time.perf_counter() - start < budget):
+        durations.append(run_process(code)[0])
+
+    stdout = run_process(PROBE + code, ['-X', 'tracemalloc'])[1]
+    line = [line for line in stdout.splitlines() if line.startswith(RESULT_MARKER)][-1]
+    probe = json.loads(line[len(RESULT_MARKER):])
+
+    return {
+        'time': min(durations), 'runs': len(durations),
+        'peak_memory': probe['peak_memory'], 'modules': probe['modules']
+    }
+
+
+def find_eager_imports(modules, lazy_modules):
+    """ Returns the modules loaded at startup which should be loaded on first use
+
+        @param modules: Names of the loaded modules
+        @param lazy_modules: Names of the modules (and their submodules) which
+                             shouldn't be loaded
+        @return: List of the names of the loaded lazy modules
+    """
+    return [
+        name for name in lazy_modules
+        if any(module == name or module.startswith(name + '.') for module in modules)
+    ]
+
+
+def run_benchmarks(names, repeat, budget):
+    """ Measures the start of the targets
+
+        @param names: Names of the targets to run
+        @param repeat: Maximum number of runs of each target
+        @param budget: Time (in s) after which a target is not run again
+        @return: [results, eager_imports]
+            - results -> ordered dictionary of the results, by target name
+              ('time', 'runs', 'peak_memory' and 'module_count')
+            - eager_imports -> dictionary of the lazy modules loaded at startup,
+              by target name
+    """
+    results = OrderedDict()
+    eager_imports = {}
+    print("{:<24}{:>12}{:>10}{:>12}".format('target', 'time (ms)', 'modules', 'peak (MiB)'))
+
+    for name in names:
+        code, lazy_modules = TARGETS[name]
+        result = measure_startup(code, repeat, budget)
+        modules = result.pop('modules')
+        result['module_count'] = len(modules)
+        results[name] = result
+
+        eager = find_eager_imports(modules, lazy_modules)
+        if eager:
+            eager_imports[name] = eager
+
+        print("{:<24}{:>12.1f}{:>10}{:>12.2f}".format(
+            name, 1000 * result['time'], len(modules), result['peak_memory'] / 2**20
+        ))
+
+    return results, eager_imports
+
+
+##########################################
+## Import profiling
+#
+def profile_imports(code, top):
+    """ Lists the modules taking the longest to import
+
+        @param code: Code run by the process
+        @param top: Number of modules to list
+        @return: List of [self_time, cumulative_time, name] (times in s), sorted
+                 by decreasing cumulative time
+    """
+    stderr = run_process(code, ['-X', 'importtime'])[2]
+    imports = []
+
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        self_time, cumulative_time, name = line[len('import time:'):].split('|')
+        imports.append([int(self_time) / 1e6, int(cumulative_time) / 1e6, name.strip()])
+
+    imports.sort(key=lambda entry: entry[1], reverse=True)
+
+    return imports[:top]
+
+
+def print_profile(names, top):
+    """ Prints the modules taking the longest to import, for each target
+    """
+    for name in names:
+        print("{} (top {} imports by cumulative time)".format(name, top))
+        print("{:>12}{:>12}  {}".format('self (ms)', 'total (ms)', 'module'))
+
+        for self_time, cumulative_time, module in profile_imports(TARGETS[name][0], top):
+            print("{:>12.1f}{:>12.1f}  {}".format(1000 * self_time, 1000 * cumulative_time, module))
+
+        print()
+
+
+##########################################
+## Main
+#
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--targets', nargs='+', choices=list(TARGETS), default=list(TARGETS),
+                        help="targets to run (default: all)")
+    parser.add_argument('--repeat', type=int, default=10,
+                        help="maximum number of runs of each target (default: %(default)s)")
+    parser.add_argument('--budget', type=float, default=5.0,
+                        help="time (in s) after which a target is not run again")
+    parser.add_argument('--profile', action='store_true',
+                        help="list the slowest imports of the targets instead of benchmarking them")
+    parser.add_argument('--top', type=int, default=15,
+                        help="number of imports listed by --profile (default: %(default)s)")
+    add_baseline_arguments(parser, DEFAULT_BASELINE)
+    parser.set_defaults(min_difference=20.0)  # the start of the processes is noisy
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        print_profile(args.targets, args.top)
+        return 0
+
+    results, eager_imports = run_benchmarks(args.targets, args.repeat, args.budget)
+    status = report(results, args)
+
+    for name in sorted(eager_imports):
+        print("Regression: {} imports {} at startup".format(
+            name, ", ".join(eager_imports[name])
+        ), file=sys.stderr)
+
+    return 1 if eager_imports else status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
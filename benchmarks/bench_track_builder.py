@@ -0,0 +1,209 @@
+#!/usr/bin/python3
+"""
+    Benchmarks of the track geometry, cones sampling and track files, without display
+
+    The benchmarks are run on synthetic open and closed tracks of increasing
+    numbers of waypoints. Their durations and peak memory are compared with a
+    stored baseline, and the exit status is 1 if some of them regressed.
+"""
+
+##########################################
+## Imports
+#
+import argparse
+import io
+import os
+import sys
+from collections import OrderedDict
+from math import radians
+import numpy as np
+from common import measure, add_baseline_arguments, report
+from src.config import *
+from src.track_builder import TrackBuilder
+from src.track_exporter import TrackExporter
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+WAYPOINTS_SPACING = 5.0  # distance (in m) between consecutive waypoints of the synthetic tracks
+WARM_UP_SIZE = 10  # number of waypoints of the tracks on which the benchmarks are warmed up
+
+
+##########################################
+## Synthetic tracks
+#
+def make_waypoints(n, closed):
+    """ Generates the waypoints of a synthetic track
+
+        The closed tracks are wavy loops and the open tracks are sinuous
+        lines, with waypoints spaced by about WAYPOINTS_SPACING.
+
+        @param n: Number of waypoints
+        @param closed: Whether the track is a closed loop
+        @return: (n, 2) array of waypoints coordinates (in m)
+    """
+    if closed:
+        radius = WAYPOINTS_SPACING * n / (2 * np.pi)
+        angles = np.linspace(0, 2 * np.pi, n, endpoint=False)
+        radii = radius * (1 + 0.1 * np.sin(3 * angles))
+        return np.column_stack((radii * np.cos(angles), radii * np.sin(angles)))
+    else:
+        k = np.arange(n)
+        return np.column_stack((WAYPOINTS_SPACING * k, 10.0 * np.sin(k / 4.0)))
+
+
+##########################################
+## Benchmarks
+#
+def get_benchmarks(waypoints, closed):
+    """ Declares the benchmarks of a track
+
+        Each benchmark runs on a new TrackBuilder, so that the spline cache
+        doesn't hide the computations.
+
+        @param waypoints: (n, 2) array of waypoints
+        @param closed: Whether the track is a closed loop
+        @return: Ordered dictionary of [function, setup] by benchmark name
+    """
+    offsets = {'x': INIT_OFFSET_X, 'y': INIT_OFFSET_Y, 'yaw': radians(INIT_OFFSET_YAW)}
+
+    def new_builder(stage=None):
+        builder = TrackBuilder()
+        builder.rng = np.random.default_rng(0)
+
+        if stage in ('sides', 'cones'):
+            builder.compute_center_points(waypoints, closed)
+        if stage == 'cones':
+            builder.compute_side_points(TRACK_WIDTH)
+
+        return builder
+
+    def new_track():
+        builder = new_builder('cones')
+        cones = builder.compute_cones(DEFAULT_SPACING_CONES, 0.0, DEFAULT_SPACING_ORANGE, closed)
+        initial_pose = builder.compute_start_pose(waypoints, offsets)
+
+        return TrackExporter(), cones, initial_pose
+
+    def export(track, track_format):
+        exporter, cones, initial_pose = track
+        stream = io.StringIO() if track_format == YAML_TRACK_FORMAT else io.BytesIO()
+        exporter.save_track(stream, cones, waypoints, initial_pose, track_format)
+        return stream
+
+    def new_file(track_format):
+        stream = export(new_track(), track_format)
+        stream.seek(0)
+        return stream
+
+    benchmarks = OrderedDict()
+    benchmarks['spline_points'] = (
+        lambda builder: builder._get_spline_points(waypoints, closed), new_builder
+    )
+    benchmarks['center_points'] = (
+        lambda builder: builder.compute_center_points(waypoints, closed), new_builder
+    )
+    benchmarks['side_points'] = (
+        lambda builder: builder.compute_side_points(TRACK_WIDTH), lambda: new_builder('sides')
+    )
+    benchmarks['cones'] = (
+        lambda builder: builder.compute_cones(
+            DEFAULT_SPACING_CONES, 0.0, DEFAULT_SPACING_ORANGE, closed
+        ), lambda: new_builder('cones')
+    )
+    benchmarks['start_pose'] = (
+        lambda builder: builder.compute_start_pose(waypoints, offsets), lambda: new_builder('cones')
+    )
+
+    for track_format in [YAML_TRACK_FORMAT, BINARY_TRACK_FORMAT]:
+        benchmarks[track_format + '_export'] = (
+            lambda track, track_format=track_format: export(track, track_format), new_track
+        )
+        benchmarks[track_format + '_import'] = (
+            lambda stream, track_format=track_format:
+                TrackExporter().load_track(stream, track_format),
+            lambda track_format=track_format: new_file(track_format)
+        )
+
+    return benchmarks
+
+
+def warm_up(names=None):
+    """ Runs the benchmarks once on small tracks, without measuring them
+
+        The first run loads the modules imported on first use (scipy, yaml,
+        see bench_startup.py for their import times) and initialises the
+        libraries, which would otherwise be timed by the first benchmark.
+
+        @param names: Names of the benchmarks to run (all of them if None)
+    """
+    for closed in [False, True]:
+        benchmarks = get_benchmarks(make_waypoints(WARM_UP_SIZE, closed), closed)
+
+        for name, (function, setup) in benchmarks.items():
+            if names is None or name in names:
+                function(setup())
+
+
+def run_benchmarks(sizes, repeat, budget, names=None):
+    """ Runs the benchmarks on open and closed tracks of several sizes
+
+        @param sizes: Numbers of waypoints of the tracks
+        @param repeat: Maximum number of runs of each benchmark
+        @param budget: Time (in s) after which a benchmark is not run again
+        @param names: Names of the benchmarks to run (all of them if None)
+        @return: Ordered dictionary of the results, by '<benchmark>/<open or closed>/<size>'
+            - 'time' -> shortest duration (in s)
+            - 'throughput' -> waypoints processed per second
+            - 'peak_memory' -> peak of allocated memory (in bytes)
+            - 'runs' -> number of timed runs
+    """
+    warm_up(names)
+    results = OrderedDict()
+    print("{:<16}{:>8}{:>9}{:>12}{:>16}{:>12}".format(
+        'benchmark', 'track', 'size', 'time (ms)', 'waypoints/s', 'peak (MiB)'
+    ))
+
+    for size in sizes:
+        for closed in [False, True]:
+            waypoints = make_waypoints(size, closed)
+            track = 'closed' if closed else 'open'
+
+            for name, (function, setup) in get_benchmarks(waypoints, closed).items():
+                if names is not None and name not in names:
+                    continue
+
+                result = measure(function, setup, repeat, budget)
+                result['throughput'] = size / max(result['time'], 1e-9)
+                results["{}/{}/{}".format(name, track, size)] = result
+
+                print("{:<16}{:>8}{:>9}{:>12.3f}{:>16.0f}{:>12.2f}".format(
+                    name, track, size, 1000 * result['time'], result['throughput'],
+                    result['peak_memory'] / 2**20
+                ))
+
+    return results
+
+
+##########################################
+## Main
+#
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="numbers of waypoints of the tracks (default: %(default)s)")
+    parser.add_argument('--benchmarks', nargs='+', default=None,
+                        help="names of the benchmarks to run (default: all)")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="maximum number of runs of each benchmark (default: %(default)s)")
+    parser.add_argument('--budget', type=float, default=2.0,
+                        help="time (in s) after which a benchmark is not run again")
+    add_baseline_arguments(parser, DEFAULT_BASELINE)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.repeat, args.budget, args.benchmarks)
+
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""
+    Common functions of the benchmarks: measurements, reports and comparison
+    with a stored baseline
+"""
+
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+# Make the package importable when the benchmarks are run as scripts
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+##########################################
+## Measurements
+#
+def measure(function, setup=None, repeat=5, budget=2.0):
+    """ Measures the execution time and the peak memory of a function
+
+        The function is run several times, each run being prepared by the
+        setup function (not measured). The peak memory is measured during an
+        additional run, since tracing the allocations slows the execution down.
+
+        @param function: Function to measure, taking the output of the setup
+                         function as argument (or no argument without setup)
+        @param setup:    Function without argument preparing a run
+        @param repeat:   Maximum number of timed runs
+        @param budget:   Time (in s) after which no new run is started
+                         (there is at least one run)
+        @return: Dictionary of the measurements
+            - 'time' -> shortest duration of a run (in s)
+            - 'runs' -> number of timed runs
+            - 'peak_memory' -> peak of memory allocated during a run (in bytes)
+    """
+    def run_once():
+        state = setup() if setup is not None else None
+        start = time.perf_counter()
+        function(state) if setup is not None else function()
+        return time.perf_counter() - start
+
+    durations = []
+    start = time.perf_counter()
+
+    while len(durations) < repeat and (not durations or time.perf_counter() - start < budget):
+        durations.append(run_once())
+
+    state = setup() if setup is not None else None
+    tracemalloc.start()
+
+    try:
+        function(state) if setup is not None else function()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {'time': min(durations), 'runs': len(durations), 'peak_memory': peak_memory}
+
+
+def get_environment():
+    """ Describes the environment in which the benchmarks are run
+    """
+    import numpy
+    import scipy
+
+    return {
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'scipy': scipy.__version__,
+        'machine': platform.machine(),
+        'system': platform.system(),
+    }
+
+
+##########################################
+## Baseline comparison
+#
+def load_baseline(path):
+    """ Loads the results stored as baseline
+
+        @param path: Path of the JSON file
+        @return: Dictionary of the results, by benchmark name
+    """
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def save_results(path, results):
+    """ Stores results in a JSON file (eg. as a new baseline)
+
+        @param path: Path of the JSON file
+        @param results: Dictionary of the results, by benchmark name
+    """
+    with open(path, 'w') as f:
+        json.dump({'environment': get_environment(), 'results': results}, f, indent=1, sort_keys=True)
+        f.write('\n')
+
+
+def compare(results, baseline, time_threshold, memory_threshold, min_difference=1e-3):
+    """ Compares results with the baseline
+
+        A benchmark regresses if it is slower than the baseline by more than
+        time_threshold and min_difference, or if it uses more memory by more
+        than memory_threshold (and 64 kiB). The benchmarks missing from the
+        baseline are ignored.
+
+        @param results: Dictionary of the results, by benchmark name
+        @param baseline: Dictionary of the baseline results, by benchmark name
+        @param time_threshold: Tolerated relative increase of the time (eg. 0.5 for 50 %)
+        @param memory_threshold: Tolerated relative increase of the peak memory
+        @param min_difference: Tolerated slowdown (in s), whatever the relative
+                               one, since short benchmarks are noisy
+        @return: [ratios, regressions]
+            - ratios -> dictionary of the time ratios to the baseline, by name
+            - regressions -> list of descriptions of the regressions
+    """
+    ratios = {}
+    regressions = []
+
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        reference = baseline[name]
+        ratios[name] = result['time'] / max(reference['time'], 1e-9)
+
+        if ratios[name] > 1.0 + time_threshold \
+                and result['time'] - reference['time'] > min_difference:
+            regressions.append("{}: {:.2f} ms instead of {:.2f} ms (x{:.2f})".format(
+                name, 1000 * result['time'], 1000 * reference['time'], ratios[name]
+            ))
+
+        if result['peak_memory'] > (1.0 + memory_threshold) * reference['peak_memory'] \
+                and result['peak_memory'] - reference['peak_memory'] > 64 * 1024:
+            regressions.append("{}: {:.2f} MiB of memory instead of {:.2f} MiB".format(
+                name, result['peak_memory'] / 2**20, reference['peak_memory'] / 2**20
+            ))
+
+    return ratios, regressions
+
+
+def add_baseline_arguments(parser, default_baseline):
+    """ Adds the arguments of the baseline comparison to a parser
+    """
+    parser.add_argument('--baseline', default=default_baseline,
+                        help="JSON file of the baseline results (default: %(default)s)")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="store the results as the new baseline instead of comparing them")
+    parser.add_argument('--output', default=None, help="JSON file where to write the results")
+    parser.add_argument('--time-threshold', type=float, default=0.5,
+                        help="tolerated relative slowdown (default: %(default)s)")
+    parser.add_argument('--memory-threshold', type=float, default=0.2,
+                        help="tolerated relative increase of the peak memory (default: %(default)s)")
+    parser.add_argument('--min-difference', type=float, default=1.0,
+                        help="tolerated slowdown in ms, for short benchmarks (default: %(default)s)")
+
+
+def report(results, args):
+    """ Stores the results or compares them with the baseline, as requested
+        by the command line arguments
+
+        @param results: Dictionary of the results, by benchmark name
+        @param args: Parsed arguments (see add_baseline_arguments)
+        @return: Exit status, 1 if some benchmarks regressed
+    """
+    if args.output is not None:
+        save_results(args.output, results)
+
+    if args.save_baseline:
+        save_results(args.baseline, results)
+        print("Baseline saved to {}".format(args.baseline))
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found at {} (use --save-baseline)".format(args.baseline))
+        return 0
+
+    ratios, regressions = compare(
+        results, load_baseline(args.baseline), args.time_threshold, args.memory_threshold,
+        args.min_difference / 1000
+    )
+
+    if ratios:
+        print("Compared {} benchmarks with {} (time ratio from x{:.2f} to x{:.2f})".format(
+            len(ratios), args.baseline, min(ratios.values()), max(ratios.values())
+        ))
+
+    for regression in regressions:
+        print("Regression: " + regression, file=sys.stderr)
+
+    return 1 if regressions else 0
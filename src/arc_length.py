@@ -0,0 +1,49 @@
+"""
+    Definition of an arc-length lookup table for sampling curves at exact distances
+"""
+
+import numpy as np
+
+
+class ArcLengthTable(object):
+    """ Cumulative length table of a densely sampled curve
+
+        The curve is evaluated once at a high resolution. Points at given
+        distances along the curve are then found by binary search in the
+        cumulative length table, and linear interpolation between the two
+        surrounding samples.
+    """
+    def __init__(self, points, derivatives, second_derivatives):
+        """ @param points: (M, 2) array of dense samples of the curve
+            @param derivatives: (M, 2) array of first derivatives at the samples
+            @param second_derivatives: (M, 2) array of second derivatives at the samples
+        """
+        self.points = points
+        self.derivatives = derivatives
+        self.second_derivatives = second_derivatives
+
+        steps = np.hypot(*np.diff(points, axis=0).T)
+        self.lengths = np.concatenate(([0.0], np.cumsum(steps)))  # cumulative length (in m)
+        self.length = self.lengths[-1]  # total length of the curve (in m)
+
+    def sample(self, distances):
+        """ Interpolates the curve at given distances from its start
+
+            @param distances: Array of distances (in m) of any shape, clipped to
+                              the curve
+            @return: [points, derivatives, second_derivatives] -> arrays of the
+                shape of the distances, plus a last dimension of size 2
+        """
+        distances = np.clip(distances, 0.0, self.length)
+        idx = np.searchsorted(self.lengths, distances, side='right') - 1
+        idx = np.clip(idx, 0, len(self.lengths) - 2)
+
+        span = self.lengths[idx+1] - self.lengths[idx]
+        ratio = np.divide(
+            distances - self.lengths[idx], span, out=np.zeros_like(span), where=span > 0
+        )[..., None]
+
+        def lerp(values):
+            return values[idx] + ratio * (values[idx+1] - values[idx])
+
+        return lerp(self.points), lerp(self.derivatives), lerp(self.second_derivatives)
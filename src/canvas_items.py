@@ -0,0 +1,92 @@
+"""
+    Definition of groups of canvas items updated in place
+"""
+
+import numpy as np
+
+
+class CanvasItems(object):
+    """ Group of persistent canvas items of the same kind (lines, ovals, ...)
+
+        Instead of deleting and creating the items at each drawing, the items
+        are kept and only the ones whose coordinates or style changed are
+        updated. Each item is identified by a key (by default its position in
+        the group): the items whose key disappeared are reused for the new keys,
+        so that items are only created or deleted when their number changes.
+    """
+    def __init__(self, canvas, kind, tag, **options):
+        """ @param canvas: tk Canvas on which to draw
+            @param kind: Kind of the items ('line', 'oval', ...)
+            @param tag: Tag given to all the items of the group
+            @param options: Options common to all the items
+        """
+        self.canvas = canvas
+        self.kind = kind
+        self.tag = tag
+        self.options = options
+
+        self._items = {}  # key -> [canvas ID, coordinates, specific options]
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def ids(self):
+        """ Canvas IDs of the items
+        """
+        return [item[0] for item in self._items.values()]
+
+    def update(self, coords, styles=None, keys=None):
+        """ Updates the items of the group
+
+            @param coords: (N, M) array of the coordinates of the N items, or
+                           list of N arrays if they have different numbers
+                           of coordinates (eg. polylines)
+            @param styles: List of N dictionaries of specific options of the
+                           items (with the same keys for all the items), None
+                           if all the items have the same options
+            @param keys: List of N hashable keys identifying the items, None
+                         to identify them by their position
+            @return: Whether items have been created
+        """
+        if isinstance(coords, np.ndarray):
+            coords = coords.reshape(len(coords), -1).tolist() if coords.size else []
+        else:
+            coords = [np.asarray(item, dtype=float).ravel().tolist() for item in coords]
+
+        styles = [{}] * len(coords) if styles is None else styles
+        keys = range(len(coords)) if keys is None else keys
+        new_keys = set(keys)
+        spare_items = [item for key, item in self._items.items() if key not in new_keys]
+        items = {}
+        created = False
+
+        for key, item_coords, style in zip(keys, coords, styles):
+            item = self._items.get(key)
+
+            if item is None and spare_items:
+                item = spare_items.pop()
+            elif item is None:
+                options = dict(self.options, tags=self.tag, **style)
+                canvas_id = getattr(self.canvas, 'create_' + self.kind)(item_coords, **options)
+                item = [canvas_id, item_coords, style]
+                created = True
+
+            if item[1] != item_coords:
+                self.canvas.coords(item[0], *item_coords)
+            if item[2] != style:
+                self.canvas.itemconfig(item[0], **style)
+
+            items[key] = [item[0], item_coords, style]
+
+        if spare_items:
+            self.canvas.delete(*[item[0] for item in spare_items])
+
+        self._items = items
+
+        return created
+
+    def clear(self):
+        """ Deletes all the items of the group
+        """
+        self.update([])
@@ -0,0 +1,112 @@
+"""
+    Centripetal Catmull-Rom interpolation, with local support
+
+    Each segment between two consecutive waypoints only depends on the four
+    surrounding waypoints, so that moving a waypoint only changes the few
+    segments next to it.
+"""
+
+import numpy as np
+
+ALPHA = 0.5  # centripetal parameterisation
+
+
+def segments_count(n_points, closed):
+    """ Returns the number of segments of a curve going through n points
+    """
+    if n_points < 2:
+        return 0
+    return n_points if closed else n_points - 1
+
+
+def affected_segments(idx, n_points, closed):
+    """ Returns the indices of the segments depending on a given waypoint
+
+        @param idx: Index of the waypoint
+        @param n_points: Number of waypoints
+        @param closed: Whether the curve is closed
+        @return: Sorted array of segment indices
+    """
+    n_segments = segments_count(n_points, closed)
+    segments = np.arange(idx - 2, idx + 2)
+
+    if closed:
+        return np.unique(segments % n_segments)
+    else:
+        return segments[(segments >= 0) & (segments < n_segments)]
+
+
+def evaluate_segments(points, closed, segments, samples):
+    """ Evaluates some segments of the curve and their first two derivatives
+
+        Each segment is sampled evenly in its local parameter, its end point
+        being excluded (it is the start of the next segment).
+
+        @param points: (N, 2) array of waypoints (N >= 2)
+        @param closed: Whether the curve is closed
+        @param segments: (m,) array of segment indices to evaluate
+        @param samples: Number of samples per segment
+        @return: [points, derivatives, second_derivatives] -> (m*samples, 2) arrays
+    """
+    t = np.arange(samples) / float(samples)
+    return _evaluate(points, closed, segments, t)
+
+
+def evaluate_end(points, closed):
+    """ Evaluates the end point of the curve and its first two derivatives
+
+        @param points: (N, 2) array of waypoints (N >= 2)
+        @param closed: Whether the curve is closed
+        @return: [points, derivatives, second_derivatives] -> (1, 2) arrays
+    """
+    last = np.array([segments_count(len(points), closed) - 1])
+    return _evaluate(points, closed, last, np.array([1.0]))
+
+
+def _evaluate(points, closed, segments, t):
+    """ Evaluates segments of the curve at some local parameters in [0, 1]
+    """
+    a, b, c, d = _hermite_coefficients(points, closed, segments)
+    t = t[None, :, None]
+    a, b, c, d = a[:, None], b[:, None], c[:, None], d[:, None]
+
+    pt = ((a*t + b)*t + c)*t + d
+    dp = (3*a*t + 2*b)*t + c
+    ddp = 6*a*t + 2*b
+
+    return pt.reshape(-1, 2), dp.reshape(-1, 2), ddp.reshape(-1, 2)
+
+
+def _hermite_coefficients(points, closed, segments):
+    """ Computes the cubic coefficients of some segments
+
+        @return: [a, b, c, d] -> (m, 2) arrays such that a segment is
+            a*t^3 + b*t^2 + c*t + d, for t in [0, 1]
+    """
+    if closed:
+        padded = np.vstack((points[-1:], points, points[:2]))
+    else:
+        # Phantom end points, mirroring the first and last segments
+        padded = np.vstack((
+            2*points[0] - points[1], points, 2*points[-1] - points[-2]
+        ))
+        padded = np.vstack((padded, padded[-1:]))
+
+    # Control points of each segment (P1 -> P2)
+    idx = np.asarray(segments)
+    p0, p1, p2, p3 = padded[idx], padded[idx+1], padded[idx+2], padded[idx+3]
+
+    # Centripetal knot intervals
+    def knot(p, q):
+        return np.maximum(np.hypot(*(q - p).T) ** ALPHA, 1e-9)[:, None]
+
+    t01, t12, t23 = knot(p0, p1), knot(p1, p2), knot(p2, p3)
+
+    # Tangents at P1 and P2, scaled to the local parameter of the segment
+    m1 = t12 * ((p1 - p0)/t01 - (p2 - p0)/(t01 + t12) + (p2 - p1)/t12)
+    m2 = t12 * ((p2 - p1)/t12 - (p3 - p1)/(t12 + t23) + (p3 - p2)/t23)
+
+    a = 2*p1 - 2*p2 + m1 + m2
+    b = -3*p1 + 3*p2 - 2*m1 - m2
+
+    return a, b, m1, p1
@@ -17,12 +17,41 @@ DEFAULT_SPACING_CONES = 3.0    # defaut distance between each cones
 DEFAULT_SPACING_ORANGE = 0.5   # default distance between orange cones
 DEFAULT_TURNING_RADIUS = 10.0  # default maximum turning radius (in m)
 DEFAULT_GRID_SIZE = 1.0
+ARC_LENGTH_SAMPLES = 10  # samples per control point of the arc-length table used to place cones
+SPLINE_CACHE_SIZE = 32   # maximum number of spline fits kept in cache
+CATMULL_ROM_SAMPLES = 10  # samples per segment of the local (Catmull-Rom) interpolation
 INIT_OFFSET_X = -2.0   # initial offset for the starting pose (along longitudinal axis)
 INIT_OFFSET_Y = 0.0    # initial offset for the starting pose (along lateral axis)
 INIT_OFFSET_YAW = 0.0  # initial offset for the starting pose (yaw, in degrees)
+DEFAULT_INTERPOLATION = 'spline'  # center line interpolation ('spline' or 'catmull_rom')
+DEFAULT_CONES_SAMPLING = 'offset'  # cones sampling on the sides ('offset' or 'spline')
+OVERLAP_MIN_DISTANCE = 1.0  # minimum distance (in m) between two parts of the track sides
+DEFAULT_MIN_TRACK_LENGTH = 150.0  # minimum length (in m) of randomly generated tracks
+DEFAULT_MAX_TRACK_LENGTH = 500.0  # maximum length (in m) of randomly generated tracks
+DEFAULT_GENERATED_WAYPOINTS = [8, 20]  # bounds on the number of waypoints of generated tracks
+DEFAULT_ATTEMPTS_PER_TRACK = 100  # maximum number of candidates proposed per generated track
+DEBUG_PIPELINE = False  # whether to print the pipeline stages run at each update
+REDRAW_FPS = 60  # maximum number of updates of the window per second
+LOD_TOLERANCE = 0.5  # maximum error (in pixels) of the simplified lines drawn
+VIEW_MARGIN = 100   # margin (in pixels) drawn around the visible part of the canvas
+BACKGROUND_PIPELINE = True  # whether to compute the track geometry in a background thread
+WORKER_POLL_PERIOD = 5      # period (in ms) of the collection of the background results
+ENABLE_TIMING = False       # whether to time the pipeline stages and the window updates
+TIMING_OVERLAY = True       # whether to display the timings on the canvas (when enabled)
+TIMING_WINDOW = 500         # number of latest durations used for the timing statistics
+TIMING_REPORT_PATH = None   # CSV or JSON file where to write the timings when quitting
+DEFAULT_TRACK_FORMAT = 'yaml'  # format of the exported tracks ('yaml' or 'npz')
+AUTOSAVE_PATH = '~/.fs_track_builder/autosave.jsonl'  # journal of the edits (None to disable)
 
 ##########################################
 ## Useful constants
 #
 ADD_STATE = 'add'        # Adding waypoints
 DELETE_STATE = 'delete'  # Removing waypoints
+SPLINE_INTERPOLATION = 'spline'            # Global interpolating B-spline
+CATMULL_ROM_INTERPOLATION = 'catmull_rom'  # Local centripetal Catmull-Rom spline
+OFFSET_CONES_SAMPLING = 'offset'  # Cones sampled on the offset curves of the center line
+SPLINE_CONES_SAMPLING = 'spline'  # Cones sampled on splines fitted on the sides
+YAML_TRACK_FORMAT = 'yaml'   # Text format, readable by humans
+BINARY_TRACK_FORMAT = 'npz'  # Compact NumPy archive, fast to load
+TIMING_ENV_VARIABLE = 'FS_TRACK_BUILDER_TIMING'  # overrides ENABLE_TIMING ('0', '1' or report path)
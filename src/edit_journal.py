@@ -0,0 +1,171 @@
+"""
+    Definition of an append-only journal of the edits of the waypoints
+"""
+
+import json
+import os
+
+
+class EditJournal(object):
+    """ History of the edits of the waypoints, with undo and redo
+
+        Each edit is stored as a delta (a waypoint added, moved or deleted, or
+        the whole list of waypoints replaced), so undoing or redoing it doesn't
+        depend on the number of waypoints. The edits, undos and redos can be
+        appended to a JSON lines file as they happen, so that the waypoints of
+        a crashed session can be restored by replaying it.
+
+        Edits are dictionaries:
+            - {'op': 'add', 'index': i, 'point': [x, y]}
+            - {'op': 'delete', 'index': i, 'point': [x, y]}
+            - {'op': 'move', 'index': i, 'from': [x, y], 'to': [x, y]}
+            - {'op': 'replace', 'old': [[x, y], ...], 'new': [[x, y], ...]}
+    """
+    def __init__(self):
+        self.edits = []     # recorded edits, the undone ones included
+        self.position = 0   # number of edits currently applied
+        self.path = None    # path of the journal file, None if not saved
+        self._file = None
+
+    def __len__(self):
+        return len(self.edits)
+
+    def __repr__(self):
+        return "EditJournal({}/{} edits applied)".format(self.position, len(self.edits))
+
+    def can_undo(self):
+        return self.position > 0
+
+    def can_redo(self):
+        return self.position < len(self.edits)
+
+    def record(self, edit):
+        """ Records a new edit, discarding the edits that could have been redone
+
+            @param edit: Dictionary describing the edit
+        """
+        del self.edits[self.position:]
+        self.edits.append(edit)
+        self.position += 1
+        self._write(edit)
+
+    def undo(self):
+        """ Steps back in the history
+
+            @return: The edit to revert (see apply_edit), None if there is none
+        """
+        if not self.can_undo():
+            return None
+
+        self.position -= 1
+        self._write({'op': 'undo'})
+
+        return self.edits[self.position]
+
+    def redo(self):
+        """ Steps forward in the history
+
+            @return: The edit to apply again, None if there is none
+        """
+        if not self.can_redo():
+            return None
+
+        self.position += 1
+        self._write({'op': 'redo'})
+
+        return self.edits[self.position - 1]
+
+    def open(self, path):
+        """ Replays a journal file if it exists, and appends the next edits to it
+
+            A truncated last line, left by a crash while writing, is removed.
+
+            @param path: Path of the journal file
+            @return: List of [x, y] coordinates of the waypoints after the
+                     replayed edits
+        """
+        self.close()
+        self.edits = []
+        self.position = 0
+
+        if os.path.exists(path):
+            valid_size = 0  # size of the part of the file that could be replayed
+
+            with open(path, 'rb') as f:
+                for line in f:
+                    try:
+                        edit = json.loads(line) if line.endswith(b'\n') else None
+                    except ValueError:
+                        edit = None
+
+                    if edit is None:
+                        break
+
+                    if edit['op'] == 'undo':
+                        self.undo()
+                    elif edit['op'] == 'redo':
+                        self.redo()
+                    else:
+                        self.record(edit)
+
+                    valid_size += len(line)
+
+            if valid_size < os.path.getsize(path):
+                os.truncate(path, valid_size)
+        else:
+            directory = os.path.dirname(path)
+
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._file = open(path, 'a')
+
+        points = []
+
+        for edit in self.edits[:self.position]:
+            apply_edit(points, edit, lambda x, y: [x, y])
+
+        return points
+
+    def close(self, remove=False):
+        """ Closes the journal file
+
+            @param remove: Whether to delete the file (when the session ends normally)
+        """
+        if self._file is None:
+            return
+
+        self._file.close()
+        self._file = None
+
+        if remove:
+            os.remove(self.path)
+
+    def _write(self, edit):
+        """ Appends an edit to the journal file, and flushes it
+        """
+        if self._file is not None:
+            self._file.write(json.dumps(edit, separators=(',', ':')) + '\n')
+            self._file.flush()
+
+
+def apply_edit(points, edit, make_point, undo=False):
+    """ Applies (or reverts) an edit on a list of waypoints
+
+        @param points: List of waypoints to modify
+        @param edit: Dictionary describing the edit
+        @param make_point: Function creating a waypoint from its coordinates (x, y)
+        @param undo: Whether to revert the edit
+    """
+    op = edit['op']
+
+    if op == 'move':
+        x, y = edit['from'] if undo else edit['to']
+        points[edit['index']] = make_point(x, y)
+    elif op == 'replace':
+        points[:] = [make_point(x, y) for x, y in (edit['old'] if undo else edit['new'])]
+    elif (op == 'add') != undo:
+        points.insert(edit['index'], make_point(*edit['point']))
+    else:
+        del points[edit['index']]
@@ -0,0 +1,210 @@
+"""
+    Headless generation of tracks, without any graphical interface
+"""
+
+import os
+import time
+from math import radians
+import numpy as np
+from src.config import *
+from src.track_builder import TrackBuilder
+from src.track_exporter import TrackExporter
+
+
+class TrackParameters(object):
+    """ Parameters used to generate the cones and the starting pose of a track
+    """
+    def __init__(self, spacing=DEFAULT_SPACING_CONES, std_spacing=0.0,
+                 orange_spacing=DEFAULT_SPACING_ORANGE, track_width=TRACK_WIDTH,
+                 close_loop=False, offset_x=INIT_OFFSET_X, offset_y=INIT_OFFSET_Y,
+                 offset_yaw=INIT_OFFSET_YAW, seed=None, validate=False):
+        """ @param spacing: Distance (in m) between two consecutive cones
+            @param std_spacing: Standard deviation (in m) of the distance between
+                                two consecutive cones
+            @param orange_spacing: Distance (in m) between orange cones
+            @param track_width: Width (in m) of the track
+            @param close_loop: Whether to close the loop
+            @param offset_x: Longitudinal offset (in m) on the initial pose
+            @param offset_y: Lateral offset (in m) on the initial pose
+            @param offset_yaw: Yaw offset (in degrees) on the initial pose
+            @param seed: Seed of the cones randomisation (None for a random seed)
+            @param validate: Whether to reject tracks with overlapping sides
+        """
+        self.spacing = spacing
+        self.std_spacing = std_spacing
+        self.orange_spacing = orange_spacing
+        self.track_width = track_width
+        self.close_loop = close_loop
+        self.offset_x = offset_x
+        self.offset_y = offset_y
+        self.offset_yaw = offset_yaw
+        self.seed = seed
+        self.validate = validate
+
+    def get_pose_offset(self):
+        """ Returns the initial pose offsets, as expected by TrackBuilder
+        """
+        return {'x': self.offset_x, 'y': self.offset_y, 'yaw': radians(self.offset_yaw)}
+
+
+class HeadlessTrackBuilder(TrackBuilder, TrackExporter):
+    """ Computes and exports tracks without graphical interface
+    """
+    def __init__(self):
+        TrackBuilder.__init__(self)
+        TrackExporter.__init__(self)
+
+    def build_track(self, waypoints, parameters):
+        """ Computes the cones and the starting pose of a track
+
+            @param waypoints: (N, 2) array of waypoints coordinates (in m)
+            @param parameters: TrackParameters instance
+            @return: [cones, initial_pose]
+                - cones -> dictionary of (N, 2) arrays of cones coordinates
+                  (sorted by color), empty if there are less than two waypoints
+                - initial_pose -> [x, y, yaw] (m and radians), None if there
+                  are less than two waypoints
+        """
+        waypoints = np.asarray(waypoints, dtype=float).reshape(-1, 2)
+        self.cones = {}
+        self.compute_center_points(waypoints, parameters.close_loop)
+
+        if len(self.center_points) == 0:
+            return self.cones, None
+
+        self.compute_side_points(parameters.track_width)
+        cones = self.compute_cones(
+            parameters.spacing, parameters.std_spacing,
+            parameters.orange_spacing, parameters.close_loop
+        )
+        initial_pose = self.compute_start_pose(waypoints, parameters.get_pose_offset())
+
+        return cones, initial_pose
+
+    def process_file(self, input_path, output_path, parameters, seed=None):
+        """ Generates a track from the waypoints of a YAML file, and exports it
+
+            @param input_path: Path of the YAML file containing the waypoints
+            @param output_path: Path of the exported file (npz format if its
+                                extension is '.npz', YAML otherwise)
+            @param parameters: TrackParameters instance
+            @param seed: Seed of the cones randomisation (None to keep the
+                         current random generator)
+            @raise ValueError: If the track is not valid
+        """
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+
+        waypoints = self.read_waypoints(input_path)
+        cones, initial_pose = self.build_track(waypoints, parameters)
+
+        if initial_pose is None:
+            raise ValueError("less than two waypoints")
+
+        if parameters.validate:
+            left, right = self.compute_overlaps(parameters.close_loop)
+
+            if len(left) > 0 or len(right) > 0:
+                raise ValueError("overlapping sides ({} segments)".format(len(left) + len(right)))
+
+        self.save_track(output_path, cones, waypoints, initial_pose)
+
+
+def export_tracks(tracks, output_dir, parameters, prefix='track',
+                  track_format=DEFAULT_TRACK_FORMAT):
+    """ Generates the cones and starting poses of some tracks, and exports them
+
+        @param tracks: List of (N, 2) arrays of waypoints coordinates (in m)
+        @param output_dir: Directory in which to export the tracks
+        @param parameters: TrackParameters instance
+        @param prefix: Prefix of the names of the exported files
+        @param track_format: Format of the exported files ('yaml' or 'npz')
+        @return: List of the paths of the exported files
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    builder = HeadlessTrackBuilder()
+    paths = []
+
+    for k, waypoints in enumerate(tracks):
+        if parameters.seed is not None:
+            builder.rng = np.random.default_rng([parameters.seed, k])
+
+        cones, initial_pose = builder.build_track(waypoints, parameters)
+
+        if initial_pose is None:
+            continue
+
+        path = os.path.join(output_dir, "{}_{:05d}.{}".format(prefix, k, track_format))
+        builder.save_track(path, cones, waypoints, initial_pose, track_format)
+        paths.append(path)
+
+    return paths
+
+
+def process_directory(input_dir, output_dir, parameters, jobs=None,
+                      track_format=DEFAULT_TRACK_FORMAT):
+    """ Generates the tracks of all the YAML files of a directory
+
+        The tracks are generated in parallel by a pool of processes.
+
+        @param input_dir: Directory containing the waypoints YAML files
+        @param output_dir: Directory in which to export the tracks
+        @param parameters: TrackParameters instance
+        @param jobs: Number of processes (None for the number of CPUs)
+        @param track_format: Format of the exported files ('yaml' or 'npz')
+        @return: [exported, errors, duration]
+            - exported -> number of exported tracks
+            - errors -> dictionary of error messages, for the files that
+              couldn't be processed
+            - duration -> processing time (in s)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    names = sorted(
+        name for name in os.listdir(input_dir)
+        if name.endswith('.yaml') or name.endswith('.yml')
+    )
+    tasks = [
+        (
+            os.path.join(input_dir, name),
+            os.path.join(output_dir, "{}.{}".format(os.path.splitext(name)[0], track_format)),
+            parameters,
+            None if parameters.seed is None else [parameters.seed, k]
+        )
+        for k, name in enumerate(names)
+    ]
+
+    from multiprocessing import Pool
+
+    jobs = jobs or os.cpu_count() or 1
+    chunk_size = max(1, len(tasks) // (8 * jobs))  # several chunks per process to balance the load
+    start = time.perf_counter()
+
+    with Pool(jobs) as pool:
+        results = pool.map(_process_task, tasks, chunk_size)
+
+    duration = time.perf_counter() - start
+    errors = {names[k]: results[k] for k in range(len(names)) if results[k] is not None}
+
+    return len(names) - len(errors), errors, duration
+
+
+_worker_builder = None  # builder reused by all the tasks of a worker process
+
+
+def _process_task(task):
+    """ Processes one file in a worker process
+
+        @param task: [input_path, output_path, parameters, seed]
+        @return: Error message, None if the track has been exported
+    """
+    global _worker_builder
+
+    if _worker_builder is None:
+        _worker_builder = HeadlessTrackBuilder()
+
+    try:
+        _worker_builder.process_file(*task)
+    except Exception as e:
+        return str(e) or type(e).__name__
+
+    return None
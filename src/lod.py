@@ -0,0 +1,102 @@
+"""
+    Level of detail functions: simplification and culling of the drawn geometry
+"""
+
+import numpy as np
+
+
+def simplify_polyline(points, tolerance):
+    """ Simplifies a polyline with the Douglas-Peucker algorithm
+
+        @param points: (N, 2) array of points of the polyline
+        @param tolerance: Maximum distance between the removed points and the
+                          simplified polyline
+        @return: (M, 2) array of the kept points (the first and last ones are
+                 always kept)
+    """
+    points = np.asarray(points)
+
+    if len(points) < 3 or tolerance <= 0:
+        return points
+
+    coords = points.astype(float)
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    ranges = [(0, len(points) - 1)]
+
+    while ranges:
+        first, last = ranges.pop()
+
+        if last - first < 2:
+            continue
+
+        # Distance of the intermediate points to the line between the ends
+        # (or to the first end if both are at the same position)
+        direction = coords[last] - coords[first]
+        offsets = coords[first+1:last] - coords[first]
+        norm = np.hypot(*direction)
+
+        if norm > 0:
+            distances = np.abs(offsets[:, 0]*direction[1] - offsets[:, 1]*direction[0]) / norm
+        else:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+
+        k = np.argmax(distances)
+
+        if distances[k] > tolerance:
+            middle = first + 1 + k
+            keep[middle] = True
+            ranges += [(first, middle), (middle, last)]
+
+    return points[keep]
+
+
+def clip_polyline(points, box):
+    """ Splits a polyline into its parts overlapping a box
+
+        A segment is kept if its bounding box overlaps the box.
+
+        @param points: (N, 2) array of points of the polyline
+        @param box: [x_min, y_min, x_max, y_max] -> bounds of the box
+        @return: List of (M, 2) arrays, the parts of the polyline in the box
+    """
+    if len(points) < 2:
+        return []
+
+    box = np.asarray(box)
+    lows = np.minimum(points[:-1], points[1:])
+    highs = np.maximum(points[:-1], points[1:])
+    visible = np.all((highs >= box[:2]) & (lows <= box[2:]), axis=1)
+    starts, ends = true_runs(visible)
+
+    return [points[start:end+1] for start, end in zip(starts.tolist(), ends.tolist())]
+
+
+def points_in_box(points, box, margin=0.0):
+    """ Returns the indices of the points inside a box
+
+        @param points: (N, 2) array of points
+        @param box: [x_min, y_min, x_max, y_max] -> bounds of the box
+        @param margin: Margin added around the box (eg. radius of the drawn points)
+        @return: Array of the indices of the points inside the box
+    """
+    if len(points) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    box = np.asarray(box, dtype=float)
+    inside = np.all((points >= box[:2] - margin) & (points <= box[2:] + margin), axis=1)
+
+    return np.flatnonzero(inside)
+
+
+def true_runs(mask):
+    """ Finds the runs of consecutive True values of a boolean array
+
+        @param mask: (N,) boolean array
+        @return: [starts, ends] -> arrays of the first index and the index
+                 following the last one of each run
+    """
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    changes = np.diff(padded)
+
+    return np.flatnonzero(changes == 1), np.flatnonzero(changes == -1)
@@ -0,0 +1,248 @@
+"""
+    Detection of intersecting or too close track boundaries
+
+    The boundaries are split into chunks of consecutive segments, whose
+    bounding boxes are stored in a uniform grid. Only the segments of the
+    chunks sharing a cell of the grid are then tested against each other.
+    Sorting the cells keys makes the detection O(n log n) instead of O(n^2).
+"""
+
+import numpy as np
+
+
+class BoxGrid(object):
+    """ Uniform grid of axis-aligned boxes, used to find pairs of nearby boxes
+    """
+    def __init__(self, lows, highs, cell_size):
+        """ @param lows: (n, 2) array of the lower corners of the boxes
+            @param highs: (n, 2) array of the upper corners of the boxes
+            @param cell_size: Size (in m) of the cells of the grid
+        """
+        self.cell_size = cell_size
+
+        # Cells covered by each box
+        low = np.floor(lows / cell_size).astype(np.int64)
+        high = np.floor(highs / cell_size).astype(np.int64)
+        spans = high - low + 1
+        counts = spans[:, 0] * spans[:, 1]
+
+        boxes = np.repeat(np.arange(len(lows)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cells = low[boxes] + np.column_stack((
+            offsets // spans[boxes, 1], offsets % spans[boxes, 1]
+        ))
+
+        # Sort the boxes by cell
+        keys = cells[:, 0] * (1 << 32) + (cells[:, 1] & 0xFFFFFFFF)
+        order = np.argsort(keys, kind='stable')
+        self._keys = keys[order]
+        self._boxes = boxes[order]
+        self._cells = cells[order]
+        self._low = low  # first cell covered by each box
+
+    def candidate_pairs(self):
+        """ Returns the pairs of boxes sharing at least one cell
+
+            Each pair is only reported by the first cell shared by the two
+            boxes (the one at the maximum of their first cells), so that no
+            deduplication is needed.
+
+            @return: [i, j] -> arrays of box indices, with i < j
+        """
+        pairs_i, pairs_j = [], []
+        k = 1
+
+        # Entries sharing a cell are consecutive, compare each entry with the
+        # following ones until no entry shares its cell
+        while k < len(self._keys):
+            same = np.flatnonzero(self._keys[:-k] == self._keys[k:])
+
+            if len(same) == 0:
+                break
+
+            i, j = self._boxes[same], self._boxes[same + k]
+            first = np.all(np.maximum(self._low[i], self._low[j]) == self._cells[same], axis=1)
+            pairs_i.append(i[first])
+            pairs_j.append(j[first])
+            k += 1
+
+        if pairs_i == []:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        i, j = np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+        return np.minimum(i, j), np.maximum(i, j)
+
+
+def find_boundary_overlaps(left, right, closed, min_distance):
+    """ Finds the boundary segments crossing or getting too close to another one
+
+        Are reported:
+            - segments crossing or closer than min_distance to a segment of
+              the other side
+            - segments crossing or closer than min_distance to a segment of
+              the same side, further than 2*min_distance along this side (eg.
+              two parts of a hairpin)
+            - if the two sides have as many points, facing segments going in
+              opposite directions (ie. a side folding onto itself in a too
+              sharp turn)
+
+        @param left: (n, 2) array of points of the left boundary
+        @param right: (m, 2) array of points of the right boundary
+        @param closed: Whether the boundaries are closed loops
+        @param min_distance: Minimum distance (in m) between two parts of the
+                             boundaries
+        @return: [left_segments, right_segments] -> sorted arrays of the
+            indices of the offending segments of each side (segment k
+            going from point k to point k+1)
+    """
+    if len(left) < 2 or len(right) < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    chunk_length = max(min_distance, 1e-6)
+    n_left = len(left) - 1
+    starts = np.vstack((left[:-1], right[:-1]))
+    ends = np.vstack((left[1:], right[1:]))
+    side = np.repeat([0, 1], [n_left, len(right) - 1])
+    local = np.concatenate((np.arange(n_left), np.arange(len(right) - 1)))
+    offending = []
+
+    # Distance of each segment along its side
+    lengths = np.hypot(*(ends - starts).T)
+    along = np.concatenate((
+        np.cumsum(lengths[:n_left]) - lengths[:n_left],
+        np.cumsum(lengths[n_left:]) - lengths[n_left:],
+    ))
+    side_lengths = np.array([lengths[:n_left].sum(), lengths[n_left:].sum()])
+
+    # Folds: facing segments of the two sides going in opposite directions
+    if len(left) == len(right):
+        directions = ends - starts
+        folded = np.flatnonzero(
+            np.einsum('ij,ij->i', directions[:n_left], directions[n_left:]) < 0
+        )
+        offending += [folded, folded + n_left]
+
+    # Split the sides in chunks of consecutive segments
+    chunk_ids = np.floor(along / chunk_length).astype(np.int64) + side * (1 << 40)
+    chunk_starts = np.flatnonzero(np.diff(chunk_ids, prepend=-1) != 0)
+    chunk_sizes = np.diff(np.append(chunk_starts, len(starts)))
+    chunk_side = side[chunk_starts]
+    chunk_first = along[chunk_starts]                   # distance along the side of
+    chunk_last = along[chunk_starts + chunk_sizes - 1]  # the first and last segments
+    lows = np.minimum.reduceat(np.minimum(starts, ends), chunk_starts) - 0.5 * min_distance
+    highs = np.maximum.reduceat(np.maximum(starts, ends), chunk_starts) + 0.5 * min_distance
+
+    # Find the pairs of nearby chunks. Chunks of the same side whose segments
+    # are all within 2*min_distance along it are skipped, since their segments
+    # are expected to be close (and crossings there are folds).
+    cell_size = max(np.percentile(highs - lows, 90), chunk_length)
+    a, b = BoxGrid(lows, highs, cell_size).candidate_pairs()
+    span = np.maximum(np.abs(chunk_last[b] - chunk_first[a]), np.abs(chunk_last[a] - chunk_first[b]))
+    keep = (chunk_side[a] != chunk_side[b]) | (span > 2 * min_distance)
+    keep &= np.all((lows[a] <= highs[b]) & (lows[b] <= highs[a]), axis=1)  # overlapping boxes
+    a, b = a[keep], b[keep]
+
+    # Test all the pairs of segments of these chunks
+    sizes = chunk_sizes[a] * chunk_sizes[b]
+    pair = np.repeat(np.arange(len(a)), sizes)
+    offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    i = chunk_starts[a][pair] + offsets // chunk_sizes[b][pair]
+    j = chunk_starts[b][pair] + offsets % chunk_sizes[b][pair]
+
+    # Close segments of the same side are only an issue if they are far along it
+    separation = np.abs(along[i] - along[j])
+    if closed:
+        separation = np.minimum(separation, side_lengths[side[i]] - separation)
+    separation -= np.maximum(lengths[i], lengths[j])
+    close_along = (side[i] == side[j]) & (separation <= 2 * min_distance)
+    i, j = i[~close_along], j[~close_along]
+
+    # Only test the segments whose boxes (widened by min_distance) overlap
+    seg_lows = np.minimum(starts, ends) - 0.5 * min_distance
+    seg_highs = np.maximum(starts, ends) + 0.5 * min_distance
+    nearby = np.all((seg_lows[i] <= seg_highs[j]) & (seg_lows[j] <= seg_highs[i]), axis=1)
+    i, j = i[nearby], j[nearby]
+
+    crossing = segments_intersect(starts[i], ends[i], starts[j], ends[j])
+    too_close = segments_distance(starts[i], ends[i], starts[j], ends[j]) < min_distance
+    offending_pairs = crossing | too_close
+
+    offending += [i[offending_pairs], j[offending_pairs]]
+    offending = np.unique(np.concatenate(offending))
+    is_left = side[offending] == 0
+
+    return local[offending[is_left]], local[offending[~is_left]]
+
+
+def find_self_intersections(points, closed):
+    """ Finds the segments of a polyline crossing another non-adjacent segment
+
+        @param points: (n, 2) array of points of the polyline (if closed, the
+                       last one being equal to the first one)
+        @param closed: Whether the polyline is a closed loop
+        @return: Sorted array of the indices of the crossing segments
+    """
+    if len(points) < 4:
+        return np.empty(0, dtype=np.int64)
+
+    starts, ends = points[:-1], points[1:]
+    n = len(starts)
+    cell_size = max(np.percentile(np.hypot(*(ends - starts).T), 90), 1e-6)
+    grid = BoxGrid(np.minimum(starts, ends), np.maximum(starts, ends), cell_size)
+    i, j = grid.candidate_pairs()
+
+    gap = j - i
+    if closed:
+        gap = np.minimum(gap, n - gap)
+    i, j = i[gap > 1], j[gap > 1]
+
+    crossing = segments_intersect(starts[i], ends[i], starts[j], ends[j])
+
+    return np.unique(np.concatenate((i[crossing], j[crossing])))
+
+
+def segments_intersect(a1, a2, b1, b2):
+    """ Checks whether pairs of segments [a1, a2] and [b1, b2] properly cross
+
+        @param a1, a2, b1, b2: (n, 2) arrays of the segments end points
+        @return: (n,) boolean array
+    """
+    o1 = _orientation(a1, a2, b1)
+    o2 = _orientation(a1, a2, b2)
+    o3 = _orientation(b1, b2, a1)
+    o4 = _orientation(b1, b2, a2)
+
+    return (o1 * o2 < 0) & (o3 * o4 < 0)
+
+
+def segments_distance(a1, a2, b1, b2):
+    """ Computes the distances between pairs of segments [a1, a2] and [b1, b2]
+
+        @param a1, a2, b1, b2: (n, 2) arrays of the segments end points
+        @return: (n,) array of distances
+    """
+    distances = np.minimum.reduce([
+        _point_segment_distance(a1, b1, b2), _point_segment_distance(a2, b1, b2),
+        _point_segment_distance(b1, a1, a2), _point_segment_distance(b2, a1, a2),
+    ])
+    distances[segments_intersect(a1, a2, b1, b2)] = 0.0
+
+    return distances
+
+
+def _orientation(p, q, r):
+    """ Sign of the orientation of the triangles (p, q, r)
+    """
+    return np.sign((q[:, 0] - p[:, 0]) * (r[:, 1] - p[:, 1])
+                   - (q[:, 1] - p[:, 1]) * (r[:, 0] - p[:, 0]))
+
+
+def _point_segment_distance(p, a, b):
+    """ Distances between points p and segments [a, b]
+    """
+    ab = b - a
+    squared_length = np.maximum(np.einsum('ij,ij->i', ab, ab), 1e-24)
+    t = np.clip(np.einsum('ij,ij->i', p - a, ab) / squared_length, 0.0, 1.0)
+
+    return np.hypot(*(p - a - t[:, None] * ab).T)
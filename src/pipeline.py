@@ -0,0 +1,143 @@
+"""
+    Definition of a dependency pipeline of computation stages
+"""
+
+import time
+from collections import OrderedDict
+
+
+class Pipeline(object):
+    """ Graph of computation stages with dirty flags
+
+        Each stage is a function without argument, whose output is cached.
+        When the inputs of a stage change, it is invalidated along with all
+        the stages depending on it. Running the pipeline then only executes
+        the invalidated stages, in the order they have been added.
+
+        Stages can also be computed outside of the pipeline (eg. in a
+        background thread): once deferred, the stages depending on them wait
+        for their outputs to be given with complete.
+    """
+    def __init__(self):
+        self.outputs = {}      # cached output of each stage
+        self.run_counts = {}   # number of times each stage has been run
+        self.last_run = []     # stages run during the last update
+        self.updates = 0       # number of updates of the pipeline
+        self.timings = None    # Timings recording the duration of the stages (None to disable)
+
+        self._stages = OrderedDict()  # name -> [function, dependencies]
+        self._dirty = set()
+        self._deferred = set()  # stages computed outside of the pipeline
+
+    def add_stage(self, name, function, dependencies=()):
+        """ Adds a stage to the pipeline
+
+            The stages have to be added after the ones they depend on.
+
+            @param name: Name of the stage
+            @param function: Function computing the output of the stage
+            @param dependencies: Names of the stages it depends on
+        """
+        for dependency in dependencies:
+            if dependency not in self._stages:
+                raise ValueError("Unknown stage '{}'".format(dependency))
+
+        self._stages[name] = (function, tuple(dependencies))
+        self.run_counts[name] = 0
+        self._dirty.add(name)
+
+    def invalidate(self, *names):
+        """ Marks stages and all the stages depending on them as dirty
+
+            @param names: Names of the stages whose inputs changed
+        """
+        invalidated = set(names)
+
+        for name, (_, dependencies) in self._stages.items():
+            if not invalidated.isdisjoint(dependencies):
+                invalidated.add(name)
+
+        self._dirty.update(invalidated)
+
+    def set_output(self, name, output):
+        """ Sets the output of a stage without running it
+
+            The stage is marked as clean, even if the stages it depends on are
+            dirty, while the stages depending on it are invalidated.
+
+            @param name: Name of the stage
+            @param output: New output of the stage
+        """
+        self.invalidate(name)
+        self._dirty.discard(name)
+        self._deferred.discard(name)
+        self.outputs[name] = output
+
+    def complete(self, name, output):
+        """ Gives the output of a stage computed outside of the pipeline
+
+            Contrary to set_output, the stages depending on it are not
+            invalidated: the ones waiting for it are dirty already, while the
+            others (eg. whose output has been set) are kept.
+
+            @param name: Name of the stage
+            @param output: Output of the stage
+        """
+        self._dirty.discard(name)
+        self._deferred.discard(name)
+        self.outputs[name] = output
+
+    def defer(self, *names):
+        """ Marks stages as being computed outside of the pipeline
+
+            The stages are not run anymore, and the stages depending on them
+            are not run until their outputs are given with complete.
+
+            @param names: Names of the stages
+        """
+        self._dirty.difference_update(names)
+        self._deferred.update(names)
+
+    def is_dirty(self, name):
+        """ Returns whether a stage needs to be run
+        """
+        return name in self._dirty
+
+    def is_deferred(self, name):
+        """ Returns whether the output of a stage is awaited from outside of
+            the pipeline
+        """
+        return name in self._deferred
+
+    def run(self):
+        """ Runs all the dirty stages, except the ones waiting for deferred stages
+
+            @return: List of the names of the stages that have been run
+        """
+        self.last_run = []
+        waiting = set(self._deferred)  # stages whose outputs are not available yet
+
+        for name, (function, dependencies) in self._stages.items():
+            if name not in self._dirty:
+                continue
+
+            if not waiting.isdisjoint(dependencies):
+                waiting.add(name)
+                continue
+
+            if self.timings is None:
+                self.outputs[name] = function()
+            else:
+                start = time.perf_counter()
+                self.outputs[name] = function()
+                self.timings.record(name, time.perf_counter() - start)
+
+            self._dirty.discard(name)
+            self._deferred.discard(name)
+            waiting.discard(name)
+            self.run_counts[name] += 1
+            self.last_run.append(name)
+
+        self.updates += 1
+
+        return self.last_run
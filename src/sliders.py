@@ -36,20 +36,22 @@ class OffsetSlider(object):
             value = radians(value)
 
         self.gui.initial_pose_offset[self.key] = value
-        self.gui.update_window()
+        self.gui.request_update('start_pose')
 
 
 class BasicSlider(object):
     """ Basic slider storing one double value
     """
-    def __init__(self, default_value, bounds, resolution, gui, frame):
+    def __init__(self, default_value, bounds, resolution, gui, frame, stage):
         """ @param default_value: default value of the slider
             @param bounds: [min, max] -> bounds on the offset
             @param resolution: resolution of the slider
             @param gui: reference to the TrackBuilderGUI instance
             @param frame: tk frame in which add the slider
+            @param stage: pipeline stage depending on the value of the slider
         """
         self.gui = gui
+        self.stage = stage
         self.var = tk.DoubleVar()
         self.var.set(default_value)
 
@@ -63,7 +65,7 @@ class BasicSlider(object):
         scale.pack(side=tk.LEFT)
 
     def _callback(self, var):
-        self.gui.update_window()
+        self.gui.request_update(self.stage)
 
     def get_value(self):
         return self.var.get()
@@ -0,0 +1,83 @@
+"""
+    Definition of a bounded LRU cache for fitted splines and their samples
+"""
+
+from collections import OrderedDict
+
+
+class SplineCache(object):
+    """ Least-recently-used cache of spline fits
+
+        Entries are dictionaries (fitted tck tuples, sampled arrays, ...) that
+        can be completed by the caller after insertion. Hits and misses are
+        counted to monitor the efficiency of the cache.
+    """
+    def __init__(self, max_size):
+        """ @param max_size: Maximum number of entries kept in the cache
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """ Returns the entry stored for a key and marks it as recently used
+
+            @param key: Hashable key
+            @return: The entry, or None if the key is not cached
+        """
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+
+        return entry
+
+    def put(self, key, entry):
+        """ Stores an entry, evicting the least recently used ones if needed
+
+            @param key: Hashable key
+            @param entry: Entry to store
+            @return: The stored entry
+        """
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+        return entry
+
+    def pop(self, key):
+        """ Removes an entry from the cache, without counting a hit or a miss
+
+            @param key: Hashable key
+            @return: The removed entry, or None if the key is not cached
+        """
+        return self._entries.pop(key, None)
+
+    def set_max_size(self, max_size):
+        """ Changes the maximum number of entries, evicting entries if needed
+        """
+        self.max_size = max_size
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """ Removes all the entries and resets the counters
+        """
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return "SplineCache(size={}/{}, hits={}, misses={})".format(
+            len(self._entries), self.max_size, self.hits, self.misses
+        )
@@ -0,0 +1,138 @@
+"""
+    Definition of a recorder of the execution times of the pipeline stages
+"""
+
+import csv
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+import numpy as np
+from src.config import ENABLE_TIMING, TIMING_REPORT_PATH, TIMING_WINDOW, TIMING_ENV_VARIABLE
+
+
+class Timings(object):
+    """ Rolling statistics of execution times
+
+        The latest durations of each measured section (pipeline stage, update
+        of the window, ...) are kept to compute their percentiles. Recording
+        is thread safe, so that the stages computed in the background thread
+        can be measured as well.
+    """
+    FIELDS = ['name', 'count', 'p50_ms', 'p95_ms', 'max_ms']  # columns of the reports
+
+    def __init__(self, window=TIMING_WINDOW):
+        """ @param window: Number of latest durations kept for each section
+        """
+        self.window = window
+        self._durations = OrderedDict()  # name -> deque of the latest durations (in s)
+        self._counts = {}                # name -> total number of measures
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "Timings({} sections)".format(len(self._durations))
+
+    def record(self, name, duration):
+        """ Records a duration
+
+            @param name: Name of the measured section
+            @param duration: Duration (in s)
+        """
+        with self._lock:
+            if name not in self._durations:
+                self._durations[name] = deque(maxlen=self.window)
+                self._counts[name] = 0
+
+            self._durations[name].append(duration)
+            self._counts[name] += 1
+
+    @contextmanager
+    def measure(self, name):
+        """ Context manager recording the duration of its block
+
+            @param name: Name of the measured section
+        """
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def get_stats(self):
+        """ Computes the statistics of the latest durations of each section
+
+            @return: List of dictionaries (see FIELDS), in the order the
+                     sections have been first recorded, durations in ms
+        """
+        with self._lock:
+            sections = [
+                (name, self._counts[name], np.array(durations))
+                for name, durations in self._durations.items()
+            ]
+
+        stats = []
+
+        for name, count, durations in sections:
+            p50, p95 = 1000 * np.percentile(durations, [50, 95])
+            stats.append({
+                'name': name, 'count': count,
+                'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3),
+                'max_ms': round(1000 * durations.max(), 3)
+            })
+
+        return stats
+
+    def format(self):
+        """ Formats the statistics as a table
+
+            @return: String of the table
+        """
+        lines = ["{:<11}{:>7}{:>9}{:>9}{:>9}".format('', 'count', 'p50 ms', 'p95 ms', 'max ms')]
+
+        for stats in self.get_stats():
+            lines.append("{name:<11}{count:>7}{p50_ms:>9.2f}{p95_ms:>9.2f}{max_ms:>9.2f}".format(
+                **stats
+            ))
+
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """ Writes the statistics to a file
+
+            @param path: Path of the file, a JSON file if its extension is
+                         '.json', a CSV file otherwise
+        """
+        stats = self.get_stats()
+
+        with open(path, 'w', newline='') as f:
+            if os.path.splitext(path)[1].lower() == '.json':
+                json.dump(stats, f, indent=2)
+            else:
+                writer = csv.DictWriter(f, fieldnames=self.FIELDS)
+                writer.writeheader()
+                writer.writerows(stats)
+
+
+def get_timing_settings():
+    """ Returns whether to record the timings, and where to write their report
+
+        The configuration can be overridden by the TIMING_ENV_VARIABLE
+        environment variable: '1' to enable the timings, '0' to disable them,
+        or the path of the report to write.
+
+        @return: [enabled, report_path] -> report_path is None if no report
+                 should be written
+    """
+    value = os.environ.get(TIMING_ENV_VARIABLE, '')
+
+    if value == '':
+        return ENABLE_TIMING, TIMING_REPORT_PATH
+    elif value == '0':
+        return False, None
+    elif value == '1':
+        return True, TIMING_REPORT_PATH
+    else:
+        return True, value
@@ -2,78 +2,118 @@
     Definition of a class for building a Formula Student track
 """
 
-from math import sqrt, atan2
+from math import atan2
 import numpy as np
-from scipy.interpolate import splprep, splev
-from src.utils import DistanceConverter, Point
+from src.config import ARC_LENGTH_SAMPLES, SPLINE_CACHE_SIZE, CATMULL_ROM_SAMPLES, \
+    DEFAULT_INTERPOLATION, CATMULL_ROM_INTERPOLATION, DEFAULT_CONES_SAMPLING, \
+    OFFSET_CONES_SAMPLING, OVERLAP_MIN_DISTANCE
+from src import catmull_rom
+from src.arc_length import ArcLengthTable
+from src.spline_cache import SplineCache
+from src.overlap import find_boundary_overlaps
 
 
-class TrackBuilder(DistanceConverter):
+class TrackBuilder(object):
     """ Base class for the TrackBuilderGUI, handles all computations
     """
 
-    def __init__(self):
-        DistanceConverter.__init__(self)
-
-        self.center_pts_x = []  # coordinates of the center points of the track
-        self.center_pts_y = []
-        self.center_n_x = []    # coordinates of the normals to the center points
-        self.center_n_y = []
-        self.left_points = []   # interpolated points of the sides of the track
-        self.right_points = []
+    def __init__(self, cache_size=SPLINE_CACHE_SIZE):
+        """ @param cache_size: Maximum number of spline fits kept in the cache
+        """
+        self.center_points = np.empty((0, 2))   # coordinates of the center points of the track
+        self.center_normals = np.empty((0, 2))  # normals to the center points
+        self.center_curvatures = np.empty(0)    # curvatures at the center points
+        self.left_points = np.empty((0, 2))     # interpolated points of the sides of the track
+        self.right_points = np.empty((0, 2))
 
         self.cones = {}  # dictionnary of cones, ordered by colors ('blue', 'yellow', 'orange')
-
-    def compute_center_points(self, waypoints, close_loop):
+        self.initial_pose = None  # [x, y, yaw] -> initial pose restored from a file
+        self.interpolation = DEFAULT_INTERPOLATION  # interpolation method of the center line
+        self.cones_sampling = DEFAULT_CONES_SAMPLING  # sampling method of the cones on the sides
+        self.rng = np.random.default_rng()  # random generator for the cones randomisation
+
+        # Cache of the spline fits, keyed by the waypoints geometry
+        self.spline_cache = SplineCache(cache_size)
+        self._center_key = None    # cache key of the current center line
+        self._sides_entry = None   # cache entry of the current sides
+        self._patched_samples = None  # [previous center key, indices of the patched samples]
+
+    def compute_center_points(self, waypoints, close_loop, changed_idx=None):
         """ Interpolates track center points between the waypoints
 
-            @param waypoints:  List of waypoints
+            @param waypoints:  (N, 2) array of waypoints coordinates (in m)
             @param close_loop: Whether to close the loop
+            @param changed_idx: Index of the only waypoint that moved since the
+                                last call (None if unknown). With the local
+                                interpolation, only the segments next to it are
+                                computed again.
             @return: [points, curvatures]
-                - points -> list of pixel coordinates ready to draw the center line
-                [x1, y1, x2, y2, ...]
-                - curvatures -> curvatures at each point
+                - points -> (n, 2) array of center points coordinates (in m)
+                - curvatures -> (n,) array of curvatures at each point
         """
-        pt_x, pt_y, n_x, n_y, curvatures = self._get_spline_points(waypoints, close_loop)
-        self.center_pts_x = pt_x
-        self.center_pts_y = pt_y
-        self.center_n_x = n_x
-        self.center_n_y = n_y
+        waypoints = np.ascontiguousarray(waypoints, dtype=float).reshape(-1, 2)
+        previous_key = self._center_key
+        self._center_key = (self.interpolation, close_loop, waypoints.tobytes())
+        self._patched_samples = None
+        entry = self.spline_cache.get(('center',) + self._center_key)
 
-        points_list = []
+        if entry is None:
+            if changed_idx is not None and self.interpolation == CATMULL_ROM_INTERPOLATION:
+                entry = self._patch_center_entry(previous_key, waypoints, close_loop, changed_idx)
+            if entry is None:
+                entry = self._compute_center_entry(waypoints, close_loop)
 
-        for k in range(len(pt_x)):
-            points_list.append(self.m_to_pxl(pt_x[k]))
-            points_list.append(self.m_to_pxl(pt_y[k]))
+            self.spline_cache.put(('center',) + self._center_key, entry)
 
-        return points_list, curvatures
+        self.center_points = entry['points']
+        self.center_normals = entry['normals']
+        self.center_curvatures = entry['curvatures']
+
+        return self.center_points, self.center_curvatures
 
     def compute_side_points(self, track_width):
         """ Interpolates points on the two sides of the track
 
             @param track_width: Width (in meters) of the track
-            @return: [left_points_list, right_points_list] -> ready to draw
-                lists of points for the two sides
+            @return: [left_points, right_points] -> (n, 2) arrays of points
+                coordinates (in m) on the two sides
         """
-        left_points_list = []     # pixel coordinates for drawing
-        right_points_list = []
-        self.left_points = []  # waypoints coordinates for cones sampling
-        self.right_points = []
+        key = ('sides', track_width) + self._center_key
+        entry = self.spline_cache.get(key)
+
+        if entry is None and self._patched_samples is not None:
+            # Only update the sides around the patched center points
+            previous_key, idx = self._patched_samples
+            entry = self.spline_cache.pop(('sides', track_width) + previous_key)
+
+            if entry is not None:
+                # Patch copies of the sides, which may still be used by the caller
+                entry = dict(entry, left=entry['left'].copy(), right=entry['right'].copy())
+                offset = 0.5 * track_width * self.center_normals[idx]
+                entry['left'][idx] = self.center_points[idx] + offset
+                entry['right'][idx] = self.center_points[idx] - offset
+                entry['offset_tables'] = self._get_offset_tables(
+                    entry['left'], entry['right'], track_width
+                )
+                entry.pop('spline_tables', None)  # fitted on the previous sides
+
+                self.spline_cache.put(key, entry)
 
-        for k in range(len(self.center_pts_x)):
-            x = self.center_pts_x[k] + 0.5 * track_width * self.center_n_x[k]
-            y = self.center_pts_y[k] + 0.5 * track_width * self.center_n_y[k]
-            left_points_list.append(self.m_to_pxl(x))
-            left_points_list.append(self.m_to_pxl(y))
-            self.left_points.append(Point(x, y))
+        if entry is None:
+            offset = 0.5 * track_width * self.center_normals
+            left = self.center_points + offset  # coordinates for cones sampling
+            right = self.center_points - offset
+            entry = self.spline_cache.put(key, {
+                'left': left,
+                'right': right,
+                'offset_tables': self._get_offset_tables(left, right, track_width),
+            })
 
-            x = self.center_pts_x[k] - 0.5 * track_width * self.center_n_x[k]
-            y = self.center_pts_y[k] - 0.5 * track_width * self.center_n_y[k]
-            right_points_list.append(self.m_to_pxl(x))
-            right_points_list.append(self.m_to_pxl(y))
-            self.right_points.append(Point(x, y))
+        self._sides_entry = entry
+        self.left_points = entry['left']
+        self.right_points = entry['right']
 
-        return left_points_list, right_points_list
+        return self.left_points, self.right_points
 
     def compute_cones(self, spacing, std_spacing, orange_spacing, close_loop):
         """ Compute the position of the cones on the two sides
@@ -83,56 +123,62 @@ class TrackBuilder(DistanceConverter):
                                 two consecutive cones
             @param orange_spacing: Distance (in meters) between orange cones
             @param close_loop: Whether the loop is closed
-            @return: Dictionnary of cones position (in m), ordered by colors
-                ('blue', 'yellow', 'orange')
-        """
-        left_cones_x, left_cones_y, left_n_x, left_n_y, _ = \
-            self._get_spline_points(self.left_points, False, spacing, std_spacing)
-        right_cones_x, right_cones_y, right_n_x, right_n_y, _ = \
-            self._get_spline_points(self.right_points, False, spacing, std_spacing)
-
-        # Add blue and yellow cones
-        offset = -1 if close_loop else 0  # not taking the last cone if the loop is closed
-
-        self.cones['blue'] = [
-            Point(left_cones_x[k], left_cones_y[k])
-            for k in range(1, len(left_cones_x) + offset)
-        ]
-        self.cones['yellow'] = [
-            Point(right_cones_x[k], right_cones_y[k])
-            for k in range(1, len(right_cones_x) + offset)
-        ]
+            @return: New dictionnary of (N, 2) arrays of cones position (in m),
+                ordered by colors ('blue', 'yellow', 'orange')
+        """
+        layouts = self._compute_cones_layouts(
+            spacing, std_spacing, orange_spacing, close_loop, 1, self.rng
+        )
 
-        # Add orange cones
-        self.cones['orange'] = []
+        # A new dictionary, since the previous one may still be used (eg. drawn
+        # while the cones are computed in the background thread)
+        self.cones = {color: layouts[color][0] for color in layouts}
 
-        if left_n_x != [] and right_n_x != []:
-            def add_orange(cones_x, cones_y, normals_x, normals_y):
-                d_x = -normals_y[0]
-                d_y = normals_x[0]
-                dist = 0.5 * orange_spacing
+        return self.cones
 
-                self.cones['orange'].append(
-                    Point(cones_x[0] + dist*d_x, cones_y[0] + dist*d_y)
-                )
-                self.cones['orange'].append(
-                    Point(cones_x[0] - dist*d_x, cones_y[0] - dist*d_y)
-                )
+    def compute_cones_batch(self, spacing, std_spacing, orange_spacing, close_loop,
+                            count, seed=None):
+        """ Computes several randomised layouts of the cones on the two sides
 
-            add_orange(left_cones_x, left_cones_y, left_n_x, left_n_y)
-            add_orange(right_cones_x, right_cones_y, right_n_x, right_n_y)
+            All the layouts are sampled from the current sides of the track, the
+            randomisation of all of them being drawn at once from a seeded
+            generator. The layouts are thus reproducible given the seed.
 
-        return self.cones
+            @param spacing: Distance (in meters) between two consecutive cones
+            @param std_spacing: Standard deviation (in m) of the distance between
+                                two consecutive cones
+            @param orange_spacing: Distance (in meters) between orange cones
+            @param close_loop: Whether the loop is closed
+            @param count: Number of layouts to generate
+            @param seed: Seed of the random generator (None for a random seed)
+            @return: Dictionnary of (count, N, 2) arrays of cones position
+                (in m), ordered by colors ('blue', 'yellow', 'orange')
+        """
+        return self._compute_cones_layouts(
+            spacing, std_spacing, orange_spacing, close_loop, count,
+            np.random.default_rng(seed)
+        )
+
+    def compute_overlaps(self, close_loop, min_distance=OVERLAP_MIN_DISTANCE):
+        """ Finds the parts of the sides crossing or getting too close to another one
+
+            @param close_loop: Whether the loop is closed
+            @param min_distance: Minimum distance (in m) between two parts of the sides
+            @return: [left_segments, right_segments] -> arrays of the indices of
+                the offending segments of each side (segment k going from
+                side point k to side point k+1)
+        """
+        return find_boundary_overlaps(self.left_points, self.right_points, close_loop, min_distance)
 
     def compute_start_pose(self, waypoints, initial_pose_offset):
         """ Computes the starting pose of the car
 
-            @param waypoints: List of waypoints of the track
+            @param waypoints: (N, 2) array of waypoints of the track
             @param initial_pose_offset: List of offsets
             @return: [x, y, yaw] -> initial pose (m and radians)
         """
-        position = np.array([waypoints[0].x, waypoints[0].y])
-        n_vector = np.array([self.center_n_x[0], self.center_n_y[0]])  # normal vector
+        position = np.array(waypoints[0], dtype=float)
+        n_vector = self.center_normals[0]  # normal vector
         d_vector = np.array([-n_vector[1], n_vector[0]])  # longitudinal vector
 
         position += initial_pose_offset['x']*d_vector + initial_pose_offset['y']*n_vector
@@ -140,95 +186,379 @@ class TrackBuilder(DistanceConverter):
 
         return position[0], position[1], yaw
 
+    def restore_track(self, cones=None, initial_pose=None):
+        """ Restores the cones and the initial pose of an imported track
+
+            The cones are not computed again, so that a randomised layout is
+            kept as it has been exported.
+
+            @param cones: Dictionary of (N, 2) arrays of cones coordinates (in m),
+                          ordered by colors ('blue', 'yellow', 'orange'), None to
+                          keep the current cones
+            @param initial_pose: [x, y, yaw] -> initial pose (m and radians), None
+                                 to keep the current one
+            @return: [cones, initial_pose] -> the restored cones and initial
+                     pose, None if not restored
+        """
+        if cones is not None:
+            cones = {
+                color: np.array(cones[color], dtype=float).reshape(-1, 2) for color in cones
+            }
+            self.cones = cones
+
+        if initial_pose is not None:
+            initial_pose = list(initial_pose)
+            self.initial_pose = initial_pose
+
+        return cones, initial_pose
+
     def _get_spline_points(self, points, periodical, spacing=0.0, std_spacing=0.0):
         """
             Interpolates a list of points
 
-            @param points:  List of points to interpolate between
+            @param points:  (N, 2) array of points to interpolate between
             @param periodical: Whether the spline should be periodical
-            @param spacing: Distance between interpolated points (0.0 for a
-                            dense interpolation)
+            @param spacing: Distance (in m, along the spline) between interpolated
+                            points (0.0 for a dense interpolation)
             @param std_spacing: Standard deviation of the distance
                                 between interpolated points (0.0 for
                                 no randomisation)
-            @return: [pt_x, pt_y, n_x, n_y, curvatures]
-                - pt_x, pt_y -> interpolated spatial coordinates
-                - d_x, d_y -> normals to the interpolated points (of unit length)
-                - curvatures -> curvature at each point
+            @return: [points, normals, curvatures]
+                - points -> (n, 2) array of interpolated spatial coordinates
+                - normals -> (n, 2) array of normals to the interpolated points
+                  (of unit length)
+                - curvatures -> (n,) array of curvature at each point
         """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+
         if len(points) < 2:
-            return [], [], [], [], []
+            return self._empty_samples()
+
+        spline = self._fit_spline(points, periodical)
+
+        if spacing <= 0.0:
+            return self._sample_dense(spline, len(points))
+        else:
+            table = self._get_arc_length_table(spline, len(points))
+            return self._sample_arc_length(table, spacing, std_spacing)
+
+    def _get_side_tables(self):
+        """ Returns the arc-length tables of the two sides of the track
+
+            Depending on the cones sampling method, the tables are either the
+            ones of the offset curves of the center line, or the ones of
+            splines fitted on the sides. The latters are fitted on the first
+            call for given sides, and stored in their cache entry.
+
+            @return: [left_table, right_table] -> ArcLengthTable (or None if
+                a side has not enough points)
+        """
+        entry = self._sides_entry
+
+        if entry is None:
+            return None, None
+
+        if self.cones_sampling == OFFSET_CONES_SAMPLING:
+            return entry['offset_tables']
+
+        if 'spline_tables' not in entry:
+            tables = []
+
+            for side in [entry['left'], entry['right']]:
+                if len(side) >= 2:
+                    spline = self._fit_spline(side, False)
+                    tables.append(self._get_arc_length_table(spline, len(side)))
+                else:
+                    tables.append(None)
+
+            entry['spline_tables'] = tuple(tables)
+
+        return entry['spline_tables']
+
+    def _get_offset_tables(self, left, right, track_width):
+        """ Builds the arc-length tables of the sides from the center line
+
+            The sides are the offset curves c(u) +/- h*n(u) of the center line,
+            whose derivatives are c'(u) * (1 +/- h*k(u)) (k being the curvature),
+            and whose normals are the ones of the center line. No spline has
+            thus to be fitted on the sides.
+
+            @param left: (n, 2) array of the left side points
+            @param right: (n, 2) array of the right side points
+            @param track_width: Width (in meters) of the track
+            @return: [left_table, right_table] -> ArcLengthTable (or None if
+                a side has not enough points)
+        """
+        if len(self.center_points) < 2:
+            return None, None
 
-        # Parse the input points
-        wp_x = []
-        wp_y = []
+        normals = self.center_normals
+        tangents = np.column_stack((-normals[:, 1], normals[:, 0]))
+        tables = []
 
-        for wp in points:
-            wp_x.append(wp.x)
-            wp_y.append(wp.y)
+        for points, h in [(left, 0.5 * track_width), (right, -0.5 * track_width)]:
+            scale = (1.0 + h * self.center_curvatures)[:, None]
+            # Second derivative giving the curvature k / (1 + h*k) of the offset curve
+            second_derivatives = -self.center_curvatures[:, None] * scale * normals
+            tables.append(ArcLengthTable(points, tangents * scale, second_derivatives))
 
-        if periodical:
-            wp_x.append(points[0].x)
-            wp_y.append(points[0].y)
+        return tuple(tables)
 
-        wp_x = np.array(wp_x)
-        wp_y = np.array(wp_y)
+    def _compute_center_entry(self, waypoints, close_loop):
+        """ Interpolates the whole center line
 
-        # Create a spline from the waypoints
-        if (len(wp_x) == 2):
-            spline, _ = splprep([wp_x, wp_y], u=None, s=0.0, per=periodical, k=1)  # straight line
-        elif (len(wp_x) == 3):
-            spline, _ = splprep([wp_x, wp_y], u=None, s=0.0, per=periodical, k=2)  # degree 2
+            @param waypoints: (N, 2) array of waypoints coordinates (in m)
+            @param close_loop: Whether to close the loop
+            @return: Cache entry of the center line
+        """
+        entry = {'spline': None}
+
+        if len(waypoints) < 2:
+            samples = self._empty_samples()
+        elif self.interpolation == CATMULL_ROM_INTERPOLATION:
+            segments = np.arange(catmull_rom.segments_count(len(waypoints), close_loop))
+            pt, d, dd = catmull_rom.evaluate_segments(
+                waypoints, close_loop, segments, CATMULL_ROM_SAMPLES
+            )
+            end_pt, end_d, end_dd = catmull_rom.evaluate_end(waypoints, close_loop)
+            d, dd = np.vstack((d, end_d)), np.vstack((dd, end_dd))
+            samples = (np.vstack((pt, end_pt)),) + self._normals_and_curvatures(d, dd)
         else:
-            spline, _ = splprep([wp_x, wp_y], u=None, s=0.0, per=periodical)
+            entry['spline'] = self._fit_spline(waypoints, close_loop)
+            samples = self._sample_dense(entry['spline'], len(waypoints))
 
-        # Determine number of interpolated points
-        if spacing <= 0.0:
-            n = 10 * len(points)
+        entry['points'], entry['normals'], entry['curvatures'] = samples
+
+        return entry
+
+    def _patch_center_entry(self, previous_key, waypoints, close_loop, changed_idx):
+        """ Updates the local interpolation of the previous center line
+            around a moved waypoint
+
+            The cache entry of the previous center line is replaced by the new
+            one. Its arrays are copied before being patched, since they may
+            still be used by the caller (eg. drawn while the next center line
+            is computed in the background thread).
+
+            @param previous_key: Cache key of the previous center line
+            @param waypoints: (N, 2) array of waypoints coordinates (in m)
+            @param close_loop: Whether to close the loop
+            @param changed_idx: Index of the moved waypoint
+            @return: The patched cache entry, or None if it can't be patched
+        """
+        if previous_key is None or previous_key[:2] != self._center_key[:2] \
+                or len(previous_key[2]) != waypoints.nbytes or len(waypoints) < 2:
+            return None
+
+        # Only the changed waypoint may differ from the previous ones
+        previous = np.frombuffer(previous_key[2]).reshape(-1, 2)
+        moved = np.flatnonzero((previous != waypoints).any(axis=1))
+
+        if len(moved) > 1 or (len(moved) == 1 and moved[0] != changed_idx):
+            return None
+
+        entry = self.spline_cache.pop(('center',) + previous_key)
+
+        if entry is None:
+            return None
+
+        # Evaluate the segments depending on the moved waypoint
+        n_segments = catmull_rom.segments_count(len(waypoints), close_loop)
+        segments = catmull_rom.affected_segments(changed_idx, len(waypoints), close_loop)
+        pt, d, dd = catmull_rom.evaluate_segments(
+            waypoints, close_loop, segments, CATMULL_ROM_SAMPLES
+        )
+        idx = (segments[:, None] * CATMULL_ROM_SAMPLES + np.arange(CATMULL_ROM_SAMPLES)).ravel()
+
+        if segments[-1] == n_segments - 1:
+            end_pt, end_d, end_dd = catmull_rom.evaluate_end(waypoints, close_loop)
+            pt, d, dd = np.vstack((pt, end_pt)), np.vstack((d, end_d)), np.vstack((dd, end_dd))
+            idx = np.append(idx, n_segments * CATMULL_ROM_SAMPLES)
+
+        # Patch them into copies of the previous samples
+        entry = dict(entry, points=entry['points'].copy(), normals=entry['normals'].copy(),
+                     curvatures=entry['curvatures'].copy())
+        normals, curvatures = self._normals_and_curvatures(d, dd)
+        entry['points'][idx] = pt
+        entry['normals'][idx] = normals
+        entry['curvatures'][idx] = curvatures
+        self._patched_samples = (previous_key, idx)
+
+        return entry
+
+    def _sample_dense(self, spline, n_points):
+        """ Densely samples a spline, evenly in its parameter
+
+            @param spline: Spline representation (tck tuple)
+            @param n_points: Number of points the spline has been fitted on
+            @return: [points, normals, curvatures] -> see _get_spline_points
+        """
+        interval = np.linspace(0, 1, 10 * n_points)
+        pt, d, dd = self._evaluate_spline(spline, interval)
+
+        return (pt,) + self._normals_and_curvatures(d, dd)
+
+    def _get_arc_length_table(self, spline, n_points):
+        """ Evaluates a spline densely once and builds its arc-length table
+
+            @param spline: Spline representation (tck tuple)
+            @param n_points: Number of points the spline has been fitted on
+            @return: ArcLengthTable of the spline
+        """
+        interval = np.linspace(0, 1, ARC_LENGTH_SAMPLES * n_points)
+        return ArcLengthTable(*self._evaluate_spline(spline, interval))
+
+    def _compute_cones_layouts(self, spacing, std_spacing, orange_spacing, close_loop,
+                               count, rng):
+        """ Computes randomised layouts of the cones on the two sides
+
+            @param rng: Random generator used for the randomisation
+            @return: Dictionnary of (count, N, 2) arrays of cones position
+                (see compute_cones_batch for the other parameters)
+        """
+        tables = self._get_side_tables()
+        distances = [self._arc_length_distances(table, spacing) for table in tables]
+        layouts = {}
+
+        # Randomise the distances of all the cones of all the layouts at once
+        if std_spacing > 0.0:
+            sizes = [len(d) - 1 for d in distances if d is not None]
+            jitter = np.split(
+                rng.normal(0, std_spacing, (count, sum(sizes))), np.cumsum(sizes)[:-1], axis=1
+            )
+
+        # Add blue and yellow cones (the first one is replaced by orange cones,
+        # and the last one is not taken if it closes the loop onto the first one)
+        starts = []
+        start_normals = []
+
+        for color, table, side_distances in zip(['blue', 'yellow'], tables, distances):
+            if side_distances is None:
+                layouts[color] = np.empty((count, 0, 2))
+                continue
+
+            end = None
+            if close_loop and table.length - side_distances[-1] < 0.5 * spacing:
+                end = -1
+
+            side_distances = np.tile(side_distances, (count, 1))
+            if std_spacing > 0.0:
+                side_distances[:, 1:] += jitter.pop(0)
+
+            cones, d, dd = table.sample(side_distances)
+            layouts[color] = cones[:, 1:end]
+            starts.append(cones[:, 0])
+            start_normals.append(self._normals_and_curvatures(d[:, 0], dd[:, 0])[0])
+
+        # Add orange cones
+        if len(starts) == 2:
+            # Orange cones are placed along the track direction around the first cones
+            starts = np.stack(starts, axis=1)
+            normals = np.stack(start_normals, axis=1)
+            directions = 0.5 * orange_spacing * np.stack((-normals[..., 1], normals[..., 0]), axis=-1)
+            layouts['orange'] = np.stack(
+                (starts + directions, starts - directions), axis=2
+            ).reshape(count, -1, 2)
         else:
-            # Estimate total length of the spline
-            length = 0.0
-            for k in range(len(points)-1):
-                length += sqrt((wp_x[k+1]-wp_x[k])**2 + (wp_y[k+1]-wp_y[k])**2)
-            n = int(length / spacing)
+            layouts['orange'] = np.empty((count, 0, 2))
+
+        return layouts
+
+    def _sample_arc_length(self, table, spacing, std_spacing):
+        """ Samples a curve at exact distances along it
 
-            if n == 0:
-                return [], [], [], [], []
+            @param table: ArcLengthTable of the curve (or None for an empty curve)
+            @param spacing: Distance (in m) between the samples
+            @param std_spacing: Standard deviation (in m) of the distance between
+                                the samples (0.0 for no randomisation)
+            @return: [points, normals, curvatures] -> see _get_spline_points
+        """
+        distances = self._arc_length_distances(table, spacing)
+
+        if distances is None:
+            return self._empty_samples()
+
+        if std_spacing > 0.0:
+            distances[1:] += self.rng.normal(0, std_spacing, len(distances) - 1)
+
+        pt, d, dd = table.sample(distances)
+
+        return (pt,) + self._normals_and_curvatures(d, dd)
 
-        # Interpolate the spline
-        interval = np.linspace(0, 1, n)
+    def _arc_length_distances(self, table, spacing):
+        """ Returns evenly spaced distances along a curve, starting from its start
 
-        if std_spacing > 0.0 and length > 0.0:
-            std = std_spacing / length
+            @param table: ArcLengthTable of the curve (or None for an empty curve)
+            @param spacing: Distance (in m) between the samples
+            @return: (n,) array of distances (in m), or None if the curve is
+                shorter than the spacing
+        """
+        if table is None or spacing <= 0.0:
+            return None
+
+        n = int(table.length / spacing)
+
+        if n == 0:
+            return None
 
-            for k in range(1, n-1):
-                interval[k] += np.random.normal(0, std)
-                interval[k] = max(0, min(1, interval[k]))
+        return spacing * np.arange(n + 1, dtype=float)
 
-        pt_x, pt_y = splev(interval, spline, der=0)
+    def _fit_spline(self, points, periodical):
+        """ Fits an interpolating spline through some points
 
-        # Get the normals
-        d_x, d_y = splev(interval, spline, der=1)  # derivatives
-        n_x = []
-        n_y = []
-        for k in range(len(d_x)):
-            norm = sqrt(d_x[k]**2 + d_y[k]**2)
-            n_x.append(d_y[k] / norm)
-            n_y.append(-d_x[k] / norm)
+            @param points: (N, 2) array of points (N >= 2)
+            @param periodical: Whether the spline should be periodical
+            @return: Spline representation (tck tuple)
+        """
+        from scipy.interpolate import splprep  # imported on first use, since scipy is slow to import
 
-        # Compute the curvatures
-        curvatures = []
+        wp = np.vstack((points, points[:1])) if periodical else points
 
-        if (len(wp_x) >= 3):
-            ddx, ddy = splev(interval, spline, der=2)
+        if (len(wp) == 2):
+            spline, _ = splprep(wp.T, u=None, s=0.0, per=periodical, k=1)  # straight line
+        elif (len(wp) == 3):
+            spline, _ = splprep(wp.T, u=None, s=0.0, per=periodical, k=2)  # degree 2
         else:
-            ddx, ddy = [0 for _ in interval], [0 for _ in interval]
+            spline, _ = splprep(wp.T, u=None, s=0.0, per=periodical)
+
+        return spline
 
-        for i in range(len(pt_x)):
-            curvatures.append((ddy[i] * d_x[i] - ddx[i] * d_y[i]) /
-                              (d_x[i] ** 2 + d_y[i] ** 2)**(3./2.))
+    def _evaluate_spline(self, spline, interval):
+        """ Evaluates a spline and its first two derivatives
 
-        return list(pt_x), list(pt_y), n_x, n_y, curvatures
+            @param spline: Spline representation (tck tuple)
+            @param interval: Array of spline parameters at which to evaluate it
+            @return: [points, derivatives, second_derivatives] -> (n, 2) arrays
+        """
+        from scipy.interpolate import splev
+
+        pt = np.column_stack(splev(interval, spline, der=0))
+        d = np.column_stack(splev(interval, spline, der=1))
+
+        if spline[2] >= 2:
+            dd = np.column_stack(splev(interval, spline, der=2))
+        else:
+            dd = np.zeros_like(d)
+
+        return pt, d, dd
+
+    def _normals_and_curvatures(self, d, dd):
+        """ Computes unit normals and curvatures from the derivatives of a curve
+
+            @param d: (..., 2) array of first derivatives
+            @param dd: (..., 2) array of second derivatives
+            @return: [normals, curvatures] -> (..., 2) and (...) arrays
+        """
+        norm = np.maximum(np.hypot(d[..., 0], d[..., 1]), 1e-12)  # avoid cusps
+        normals = np.stack((d[..., 1], -d[..., 0]), axis=-1) / norm[..., None]
+        curvatures = (dd[..., 1] * d[..., 0] - dd[..., 0] * d[..., 1]) / norm**3
+
+        return normals, curvatures
+
+    def _empty_samples(self):
+        """ Returns empty [points, normals, curvatures] arrays
+        """
+        return np.empty((0, 2)), np.empty((0, 2)), np.empty(0)
 
     def snap_coord_to_grid(self, x, y, grid_size):
         """ Snaps spatial coordinates to a grid
@@ -2,10 +2,17 @@
     Definition of a class for importing/exporting tracks
 """
 
-import yaml
-import tkinter as tk
-from tkinter.filedialog import asksaveasfile, askopenfilename
-from src.waypoint import Waypoint
+import os
+import numpy as np
+from src.config import YAML_TRACK_FORMAT, BINARY_TRACK_FORMAT
+from src.waypoint import WaypointSet
+
+
+CONES_COLORS = ['blue', 'yellow', 'big_orange']  # names of the cones colors in the files
+
+# Version of the frame of the track files. The files without version (1) have
+# been written with only the y-axis of the cones inversed.
+FORMAT_VERSION = 2
 
 
 class TrackExporter(object):
@@ -16,75 +23,295 @@ class TrackExporter(object):
     """
 
     def export_track(self, cones, waypoints, initial_pose):
-        """ Exports the track as a YAML file
+        """ Exports the track in a file chosen in a dialog
 
-            @param cones:        Dictionary of cones coordinates (sorted by color)
-            @param waypoints:    List of waypoints
+            The format is deduced from the extension of the file (see save_track).
+
+            @param cones:        Dictionary of (N, 2) arrays of cones coordinates (sorted by color)
+            @param waypoints:    (N, 2) array of waypoints coordinates
             @param initial_pose: [x, y, yaw] -> initial pose of the car (m and radians)
         """
-        f = asksaveasfile(
-            mode="w",
-            filetypes=(("YAML files", "*.yaml"), ("All files", "*.*"))
+        from tkinter.filedialog import asksaveasfilename
+
+        file_name = asksaveasfilename(
+            filetypes=(
+                ("YAML files", "*.yaml"), ("NumPy archives", "*.npz"), ("All files", "*.*")
+            )
         )
 
-        if f is None:
+        if not file_name:
             return
 
+        self.save_track(file_name, cones, waypoints, initial_pose)
+
+    def save_track(self, destination, cones, waypoints, initial_pose, track_format=None):
+        """ Writes the track in a file
+
+            @param destination:  Path of the file, or opened file in which to write
+                                 (text file for YAML, binary file for npz)
+            @param cones:        Dictionary of (N, 2) arrays of cones coordinates (sorted by color)
+            @param waypoints:    (N, 2) array of waypoints coordinates
+            @param initial_pose: [x, y, yaw] -> initial pose of the car (m and radians)
+            @param track_format: YAML_TRACK_FORMAT or BINARY_TRACK_FORMAT, None to
+                                 deduce it from the extension of the path (YAML by
+                                 default)
+        """
+        if track_format is None:
+            track_format = get_track_format(destination)
+
+        if track_format == BINARY_TRACK_FORMAT:
+            write = self.write_binary_track
+            mode = 'wb'
+        elif track_format == YAML_TRACK_FORMAT:
+            write = self.write_track
+            mode = 'w'
+        else:
+            raise ValueError("unknown track format: {}".format(track_format))
+
+        if hasattr(destination, 'write'):
+            write(destination, cones, waypoints, initial_pose)
+        else:
+            with open(destination, mode) as f:
+                write(f, cones, waypoints, initial_pose)
+
+    def write_track(self, f, cones, waypoints, initial_pose):
+        """ Writes the track in YAML format
+
+            @param f:            Opened text file in which to write
+            @param cones:        Dictionary of (N, 2) arrays of cones coordinates (sorted by color)
+            @param waypoints:    (N, 2) array of waypoints coordinates
+            @param initial_pose: [x, y, yaw] -> initial pose of the car (m and radians)
+        """
+        track = to_file_frame(cones, waypoints, initial_pose)
+        initial_pose = track['initial_pose']
+        text = ["format_version: {}\n\n".format(FORMAT_VERSION)]
+
         # Initial pose
-        f.write("initial_pose:\n")
-        f.write("  x: {:7.2f}  # x coordinate of the rear axle\n".format(initial_pose[0]))
-        f.write("  y: {:7.2f}  # y coordinate of the rear axle\n".format(initial_pose[1]))
-        f.write("  z: {:7.2f}  # yaw in radians\n".format(initial_pose[2]))
+        text.append("initial_pose:\n")
+        text.append("  x: {:7.2f}  # x coordinate of the rear axle\n".format(initial_pose[0]))
+        text.append("  y: {:7.2f}  # y coordinate of the rear axle\n".format(initial_pose[1]))
+        text.append("  z: {:7.2f}  # yaw in radians\n".format(initial_pose[2]))
 
         # Cones
-        f.write("\ncones:\n")
+        text.append("\ncones:\n")
 
-        for key in cones:
-            color = key if key != 'orange' else 'big_orange'
-            f.write("  {}: [\n".format(color))
+        for color in CONES_COLORS:
+            text.append("  {}: [\n".format(color))
+            text.append(_format_points(track[color], "    "))
+            text.append("  ]\n")
 
-            for cone in cones[key]:
-                f.write("    [{:.2f}, {:.2f}],\n".format(cone.x, -cone.y))
+        # Waypoints
+        text.append("\nwaypoints: [\n")
+        text.append(_format_points(track['waypoints'], "  "))
+        text.append("]\n")
 
-            f.write("  ]\n")
+        f.write("".join(text))
 
-        # Waypoints
-        f.write("\nwaypoints: [\n")
+    def write_binary_track(self, f, cones, waypoints, initial_pose):
+        """ Writes the track as an uncompressed NumPy archive (npz)
 
-        for waypoint in waypoints:
-            f.write("  [{:.2f}, {:.2f}],\n".format(waypoint.x, waypoint.y))
+            The archive contains one (N, 2) array per cones color ('blue',
+            'yellow', 'big_orange'), the (N, 2) array of waypoints, the
+            initial pose [x, y, yaw] and the format version, in the same frame
+            as the YAML files.
 
-        f.write("]\n")
-        f.close()
+            @param f:            Path of the file, or opened binary file in which to write
+            @param cones:        Dictionary of (N, 2) arrays of cones coordinates (sorted by color)
+            @param waypoints:    (N, 2) array of waypoints coordinates
+            @param initial_pose: [x, y, yaw] -> initial pose of the car (m and radians)
+        """
+        np.savez(f, format_version=FORMAT_VERSION, **to_file_frame(cones, waypoints, initial_pose))
 
-    def import_track(self, waypoint_radius):
-        """ Imports the track from a YAML file
+    def import_track(self, waypoint_radius, transform=None):
+        """ Imports the track from a file chosen in a dialog
 
             @param waypoint_radius: Radius (in pixels) of the waypoint
-            @return: List of waypoints
+            @param transform:       Transform of the view in which the waypoints
+                                    are drawn
+            @return: [waypoints, cones, initial_pose]
+                - waypoints -> WaypointSet, empty if the file couldn't be read
+                - cones -> dictionary of (N, 2) arrays of cones coordinates
+                  (sorted by color), None if the file doesn't contain cones
+                - initial_pose -> [x, y, yaw] (m and radians), None if the file
+                  doesn't contain it
         """
+        from tkinter.filedialog import askopenfilename
 
         file_name = askopenfilename(
             defaultextension='yaml',
-            filetypes=(("YAML files", "*.yaml"), ("All files", "*.*"))
+            filetypes=(
+                ("YAML files", "*.yaml"), ("NumPy archives", "*.npz"), ("All files", "*.*")
+            )
         )
 
         try:
-            f = open(file_name, 'r')
+            track = self.load_track(file_name)
         except Exception:
-            return []
+            return WaypointSet(waypoint_radius, transform), None, None
+
+        waypoints = WaypointSet(waypoint_radius, transform, track['waypoints'])
+
+        return waypoints, track['cones'], track['initial_pose']
+
+    def load_track(self, source, track_format=None):
+        """ Reads a track from a file
+
+            YAML files are parsed with the C implementation of the safe loader
+            when it is available. The files without format version, exported
+            before the y-axis of the waypoints and initial pose was inversed,
+            are converted as well.
+
+            @param source:       Path of the file, or opened file to read from
+                                 (text file for YAML, binary file for npz)
+            @param track_format: YAML_TRACK_FORMAT or BINARY_TRACK_FORMAT, None to
+                                 deduce it from the extension of the path
+            @return: Dictionary with the following keys:
+                - 'waypoints' -> (N, 2) array of waypoints coordinates
+                - 'cones' -> dictionary of (N, 2) arrays of cones coordinates
+                  ('blue', 'yellow', 'orange'), None if the file doesn't contain cones
+                - 'initial_pose' -> [x, y, yaw] (m and radians), None if the file
+                  doesn't contain it
+        """
+        if track_format is None:
+            track_format = get_track_format(source)
+
+        if track_format == BINARY_TRACK_FORMAT:
+            with np.load(source, allow_pickle=False) as data:
+                data = {key: data[key] for key in data.files}
+            cones = data if CONES_COLORS[0] in data else None
+            pose = data.get('initial_pose')
+        elif track_format == YAML_TRACK_FORMAT:
+            if hasattr(source, 'read'):
+                data = _load_yaml(source)
+            else:
+                with open(source, 'r') as f:
+                    data = _load_yaml(f)
+            cones = data.get('cones')
+            pose = data.get('initial_pose')
+            pose = None if pose is None else [pose['x'], pose['y'], pose['z']]
         else:
-            if f is None:
-                return []
+            raise ValueError("unknown track format: {}".format(track_format))
 
-        data = yaml.load(f, Loader=yaml.FullLoader)
-        f.close()
+        version = int(data.get('format_version', 1))
 
-        waypoints = [
-            Waypoint(
-                data['waypoints'][k][0], -data['waypoints'][k][1], waypoint_radius
-            )
-            for k in range(len(data['waypoints']))
+        if version > FORMAT_VERSION:
+            raise ValueError("unsupported track format version: {}".format(version))
+
+        return from_file_frame(cones, data['waypoints'], pose, legacy=(version == 1))
+
+    def read_waypoints(self, file_name):
+        """ Reads the waypoints of a track from a file
+
+            @param file_name: Path of the YAML or npz file
+            @return: (N, 2) array of waypoints coordinates
+        """
+        return self.load_track(file_name)['waypoints']
+
+
+def get_track_format(destination):
+    """ Returns the format of a track file, deduced from its extension
+
+        @param destination: Path of the file, or opened file
+        @return: BINARY_TRACK_FORMAT for '.npz' files, YAML_TRACK_FORMAT otherwise
+    """
+    name = getattr(destination, 'name', destination)
+
+    if isinstance(name, str) and os.path.splitext(name)[1].lower() == '.npz':
+        return BINARY_TRACK_FORMAT
+
+    return YAML_TRACK_FORMAT
+
+
+def to_file_frame(cones, waypoints, initial_pose):
+    """ Converts a track to the frame of the exported files (inversed y-axis)
+
+        @param cones:        Dictionary of (N, 2) arrays of cones coordinates (sorted by color)
+        @param waypoints:    (N, 2) array of waypoints coordinates
+        @param initial_pose: [x, y, yaw] -> initial pose of the car (m and radians)
+        @return: Dictionary of arrays, indexed by the names used in the files
+    """
+    track = {}
+
+    for key, color in zip(['blue', 'yellow', 'orange'], CONES_COLORS):
+        track[color] = _flip_y(cones.get(key, []))
+
+    track['waypoints'] = _flip_y(waypoints)
+    track['initial_pose'] = np.array(
+        [initial_pose[0], -initial_pose[1], -initial_pose[2]], dtype=float
+    )
+
+    return track
+
+
+def from_file_frame(cones, waypoints, initial_pose, legacy=False):
+    """ Converts a track read from a file back to the frame of the builder
+
+        @param cones:        Dictionary of (N, 2) arrays of cones coordinates, indexed
+                             by the names used in the files, None if there are no cones
+        @param waypoints:    (N, 2) array of waypoints coordinates
+        @param initial_pose: [x, y, yaw] -> initial pose of the car, None if unknown
+        @param legacy:       Whether the track comes from a file without format
+                             version, whose waypoints and initial pose are already
+                             in the frame of the builder
+        @return: Dictionary of the track, as returned by TrackExporter.load_track
+    """
+    if legacy:
+        waypoints = np.array(waypoints, dtype=float).reshape(-1, 2)
+    else:
+        waypoints = _flip_y(waypoints)
+
+    track = {'waypoints': waypoints, 'cones': None, 'initial_pose': None}
+
+    if cones is not None:
+        track['cones'] = {
+            key: _flip_y([] if cones.get(color) is None else cones[color])
+            for key, color in zip(['blue', 'yellow', 'orange'], CONES_COLORS)
+        }
+
+    if initial_pose is not None:
+        sign = 1.0 if legacy else -1.0
+        track['initial_pose'] = [
+            float(initial_pose[0]), sign * float(initial_pose[1]), sign * float(initial_pose[2])
         ]
 
-        return waypoints
+    return track
+
+
+def _flip_y(points):
+    """ Returns a copy of an array of points, with the y-axis inversed
+
+        @param points: (N, 2) array of points coordinates
+        @return: (N, 2) array of float coordinates
+    """
+    points = np.array(points, dtype=float).reshape(-1, 2)
+    points[:, 1] *= -1
+
+    return points
+
+
+def _format_points(points, indent):
+    """ Formats a list of points as YAML flow sequences, one per line
+
+        @param points: (N, 2) array of points coordinates
+        @param indent: Indentation of the lines
+        @return: Formatted text
+    """
+    line = indent + "[%.2f, %.2f],\n"
+
+    return (line * len(points)) % tuple(points.ravel().tolist())
+
+
+def _load_yaml(stream):
+    """ Parses a YAML document
+
+        yaml is only imported here, on the first import of a YAML track, since
+        it is not needed to start the interface or to write the tracks.
+
+        @param stream: Opened file (or text stream)
+        @return: Parsed document
+    """
+    import yaml
+
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)  # C implementation if available
+
+    return yaml.load(stream, Loader=loader)
@@ -0,0 +1,167 @@
+"""
+    Procedural generation of random closed tracks
+"""
+
+import os
+import numpy as np
+from src.config import *
+from src.track_builder import TrackBuilder
+from src.overlap import find_self_intersections
+
+
+class TrackGenerator(TrackBuilder):
+    """ Generates random closed loops of waypoints, and keeps the valid ones
+
+        Candidate loops are fitted with the same splines as in the GUI, and
+        rejected if they have too sharp turns, a length out of bounds, a
+        self-intersecting center line or overlapping sides.
+    """
+    def __init__(self, turning_radius=DEFAULT_TURNING_RADIUS,
+                 min_length=DEFAULT_MIN_TRACK_LENGTH, max_length=DEFAULT_MAX_TRACK_LENGTH,
+                 n_waypoints=DEFAULT_GENERATED_WAYPOINTS, track_width=TRACK_WIDTH,
+                 seed=None):
+        """ @param turning_radius: Minimum turning radius (in m) of the center line
+            @param min_length: Minimum length (in m) of the track
+            @param max_length: Maximum length (in m) of the track
+            @param n_waypoints: [min, max] -> bounds on the number of waypoints
+            @param track_width: Width (in m) of the track
+            @param seed: Seed of the random generator (None for a random seed)
+        """
+        TrackBuilder.__init__(self, cache_size=1)  # candidates are never evaluated twice
+
+        self.turning_radius = turning_radius
+        self.min_length = min_length
+        self.max_length = max_length
+        self.n_waypoints = n_waypoints
+        self.track_width = track_width
+        self.rng = np.random.default_rng(seed)
+
+        self.attempts = 0  # number of proposed candidates
+        self.rejections = {'curvature': 0, 'length': 0, 'intersection': 0, 'overlap': 0}
+
+    def generate(self, count, max_attempts=None):
+        """ Generates valid tracks
+
+            @param count: Number of tracks to generate
+            @param max_attempts: Maximum number of candidates to propose (None
+                                 for no limit)
+            @return: List of (N, 2) arrays of waypoints coordinates (in m)
+        """
+        tracks = []
+        attempts = 0
+
+        while len(tracks) < count and (max_attempts is None or attempts < max_attempts):
+            waypoints = self.propose()
+            attempts += 1
+
+            if self.check(waypoints) is None:
+                tracks.append(waypoints)
+
+        return tracks
+
+    def propose(self):
+        """ Proposes a random closed loop of waypoints
+
+            The waypoints are spread around a circle whose radius is perturbed
+            by a few random low-frequency harmonics.
+
+            @return: (N, 2) array of waypoints coordinates (in m)
+        """
+        self.attempts += 1
+        n = self.rng.integers(self.n_waypoints[0], self.n_waypoints[1] + 1)
+
+        # Angles of the waypoints, roughly evenly spread
+        angles = (np.arange(n) + self.rng.uniform(-0.3, 0.3, n)) * 2*np.pi / n
+
+        # Radius, with a mean leading to a length within the bounds
+        mean_radius = self.rng.uniform(self.min_length, self.max_length) / (2*np.pi)
+        harmonics = np.arange(2, 6)
+        amplitudes = self.rng.uniform(0.0, 0.25, len(harmonics)) / harmonics
+        phases = self.rng.uniform(0.0, 2*np.pi, len(harmonics))
+        radius = mean_radius * (
+            1.0 + np.sum(amplitudes * np.sin(np.outer(angles, harmonics) + phases), axis=1)
+        )
+
+        return np.column_stack((radius * np.cos(angles), radius * np.sin(angles)))
+
+    def check(self, waypoints):
+        """ Checks whether a closed loop of waypoints gives a valid track
+
+            @param waypoints: (N, 2) array of waypoints coordinates (in m)
+            @return: Reason of the rejection ('curvature', 'length',
+                'intersection' or 'overlap'), None if the track is valid
+        """
+        points, curvatures = self.compute_center_points(waypoints, True)
+        reason = None
+
+        if np.abs(curvatures).max() > 1.0 / self.turning_radius:
+            reason = 'curvature'
+        else:
+            length = np.hypot(*np.diff(points, axis=0).T).sum()
+
+            if length < self.min_length or length > self.max_length:
+                reason = 'length'
+            elif len(find_self_intersections(points, True)) > 0:
+                reason = 'intersection'
+            else:
+                self.compute_side_points(self.track_width)
+                if any(len(segments) > 0 for segments in self.compute_overlaps(True)):
+                    reason = 'overlap'
+
+        if reason is not None:
+            self.rejections[reason] += 1
+
+        return reason
+
+
+def generate_tracks(count, jobs=None, seed=None, max_attempts=None, **kwargs):
+    """ Generates valid random tracks in parallel
+
+        Each process has its own random generator, spawned from the given seed,
+        and a share of the maximum number of candidates proportional to the
+        number of tracks it generates. Fewer tracks than requested are returned
+        if the candidates run out (eg. with constraints hard to meet).
+
+        @param count: Number of tracks to generate
+        @param jobs: Number of processes (None for the number of CPUs)
+        @param seed: Seed of the random generators (None for a random seed)
+        @param max_attempts: Maximum total number of candidates to propose (None
+                             for DEFAULT_ATTEMPTS_PER_TRACK per track)
+        @param kwargs: Arguments of the TrackGenerator
+        @return: [tracks, attempts]
+            - tracks -> list of (N, 2) arrays of waypoints coordinates (in m)
+            - attempts -> total number of proposed candidates
+    """
+    from multiprocessing import Pool
+
+    if max_attempts is None:
+        max_attempts = DEFAULT_ATTEMPTS_PER_TRACK * count
+
+    jobs = min(jobs or os.cpu_count() or 1, max(count, 1))
+    seeds = np.random.SeedSequence(seed).spawn(jobs)
+    counts = [count // jobs + (1 if k < count % jobs else 0) for k in range(jobs)]
+    attempts = [max_attempts * counts[k] // max(count, 1) for k in range(jobs)]
+    attempts[0] += max_attempts - sum(attempts)  # remainder of the division
+
+    with Pool(jobs) as pool:
+        results = pool.map(
+            _generate_task, [(counts[k], attempts[k], seeds[k], kwargs) for k in range(jobs)]
+        )
+
+    tracks = [track for worker_tracks, _ in results for track in worker_tracks]
+    attempts = sum(worker_attempts for _, worker_attempts in results)
+
+    return tracks, attempts
+
+
+def _generate_task(task):
+    """ Generates tracks in a worker process
+
+        @param task: [count, max_attempts, seed, kwargs]
+        @return: [tracks, attempts]
+    """
+    count, max_attempts, seed, kwargs = task
+    generator = TrackGenerator(seed=seed, **kwargs)
+    tracks = generator.generate(count, max_attempts)
+
+    return tracks, generator.attempts
@@ -0,0 +1,281 @@
+"""
+    Definition of a library of tracks, stored in a single indexed file
+"""
+
+import os
+import numpy as np
+from src.track_exporter import TrackExporter, CONES_COLORS, to_file_frame, from_file_frame
+
+
+##########################################
+## File layout
+#
+# The file starts with a fixed size header, followed by the data of the tracks
+# and the index. The data of a track is the concatenation of its arrays of cones
+# ('blue', 'yellow', 'big_orange') and waypoints, as float64 (x, y) pairs in the
+# frame of the exported files. The index holds one record per track, giving the
+# position of its data. Appending tracks writes their data and a new index at the
+# end of the file, then updates the header: the file stays valid if the process
+# is interrupted in between.
+#
+MAGIC = b'FSTRKLIB'
+VERSION = 1
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'), ('version', '<u8'), ('count', '<u8'), ('index_offset', '<u8')
+])
+INDEX_DTYPE = np.dtype([
+    ('name', 'S64'),            # identifier of the track
+    ('offset', '<u8'),          # position (in bytes) of the data of the track
+    ('sizes', '<u8', (4,)),     # number of points of each array (cones, waypoints)
+    ('initial_pose', '<f8', (3,)),  # [x, y, yaw], NaN if unknown
+])
+ARRAY_NAMES = CONES_COLORS + ['waypoints']  # arrays stored in the data of a track
+
+
+class TrackLibrary(object):
+    """ Collection of tracks stored in a single memory-mapped file
+
+        The tracks can be fetched by name or position without reading the rest
+        of the file. Tracks are returned in the same format as
+        TrackExporter.load_track (tracks without any cone have None as cones).
+    """
+    def __init__(self, path, mode='r'):
+        """ @param path: Path of the library file
+            @param mode: 'r' to read an existing library, 'a' to append tracks
+                         to it (it is created if it doesn't exist)
+        """
+        if mode not in ('r', 'a'):
+            raise ValueError("invalid mode: {}".format(mode))
+
+        self.path = path
+        self.mode = mode
+
+        if mode == 'a' and not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(_make_header(0, HEADER_DTYPE.itemsize).tobytes())
+
+        self._file = open(path, 'rb' if mode == 'r' else 'r+b')
+        self._pending = []  # index records of the appended tracks not yet in the index
+        self._load()
+
+    def __len__(self):
+        return len(self.index) + len(self._pending)
+
+    def __contains__(self, name):
+        return name in self._positions
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return "TrackLibrary('{}', {} tracks)".format(self.path, len(self))
+
+    @property
+    def names(self):
+        """ Names of the tracks, in the order they have been added
+        """
+        return [name.decode() for name in self.index['name']] + [
+            record['name'].decode() for record in self._pending
+        ]
+
+    def get(self, key):
+        """ Returns a track of the library
+
+            The appended tracks can be read before the library is flushed: their
+            records are kept in memory, and the file is mapped again if their
+            data is beyond the current mapping.
+
+            @param key: Name of the track, or its position in the library
+            @return: Dictionary of the track, as returned by TrackExporter.load_track
+            @raise KeyError: If there is no track with this name
+            @raise IndexError: If there is no track at this position
+        """
+        position = self._positions[key] if isinstance(key, str) else key
+
+        if not -len(self) <= position < len(self):
+            raise IndexError("track position out of range: {}".format(position))
+
+        position %= len(self)
+
+        if position < len(self.index):
+            record = self.index[position]
+        else:
+            record = self._pending[position - len(self.index)]
+
+        arrays = {}
+        start = int(record['offset'])
+        data = self._map(start + 16*int(record['sizes'].sum()))
+
+        for name, size in zip(ARRAY_NAMES, record['sizes'].tolist()):
+            arrays[name] = data[start:start + 16*size].view('<f8').reshape(-1, 2)
+            start += 16*size
+
+        cones = arrays if record['sizes'][:3].any() else None
+        pose = record['initial_pose']
+        pose = None if np.isnan(pose).any() else pose
+
+        return from_file_frame(cones, arrays['waypoints'], pose)
+
+    def append(self, name, cones, waypoints, initial_pose=None):
+        """ Appends a track at the end of the library
+
+            The track is only visible to other readers once the library has been
+            flushed or closed.
+
+            @param name: Name of the track (at most 64 bytes when encoded in UTF-8)
+            @param cones: Dictionary of (N, 2) arrays of cones coordinates (sorted
+                          by color), None if there are no cones
+            @param waypoints: (N, 2) array of waypoints coordinates
+            @param initial_pose: [x, y, yaw] -> initial pose of the car (m and radians),
+                                 None if unknown
+            @raise ValueError: If a track with this name already exists
+        """
+        if self.mode != 'a':
+            raise IOError("library opened in read mode")
+
+        encoded_name = name.encode()
+
+        if name in self._positions:
+            raise ValueError("track '{}' already in the library".format(name))
+        if len(encoded_name) > INDEX_DTYPE['name'].itemsize:
+            raise ValueError("track name too long: {}".format(name))
+
+        pose = initial_pose if initial_pose is not None else [np.nan] * 3
+        track = to_file_frame(cones or {}, waypoints, pose)
+
+        record = np.zeros((), dtype=INDEX_DTYPE)
+        record['name'] = encoded_name
+        record['offset'] = self._file.seek(0, os.SEEK_END)
+        record['sizes'] = [len(track[array_name]) for array_name in ARRAY_NAMES]
+        record['initial_pose'] = track['initial_pose']
+
+        self._file.write(b''.join(track[array_name].astype('<f8').tobytes()
+                                  for array_name in ARRAY_NAMES))
+        self._positions[name] = len(self)
+        self._pending.append(record)
+
+    def flush(self):
+        """ Writes the index of the appended tracks, making them visible
+
+            The whole index is written again at the end of the file, the
+            previous one being left unused: flush once after appending many
+            tracks rather than after each of them.
+        """
+        if not self._pending:
+            return
+
+        index = np.concatenate([self.index, np.stack(self._pending)])
+        index_offset = self._file.seek(0, os.SEEK_END)
+        self._file.write(index.tobytes())
+        self._file.flush()
+
+        self._file.seek(0)
+        self._file.write(_make_header(len(index), index_offset).tobytes())
+        self._file.flush()
+
+        self._pending = []
+        self._load()
+
+    def close(self):
+        """ Flushes the appended tracks, and closes the file
+        """
+        if self._file.closed:
+            return
+
+        if self.mode == 'a':
+            self.flush()
+
+        self._data = None
+        self.index = None
+        self._file.close()
+
+    def _load(self):
+        """ Maps the file in memory, and reads its header and index
+        """
+        header = np.fromfile(self._file.name, dtype=HEADER_DTYPE, count=1)
+
+        if len(header) == 0 or header['magic'][0] != MAGIC:
+            raise ValueError("not a track library: {}".format(self.path))
+        if header['version'][0] != VERSION:
+            raise ValueError("unsupported track library version: {}".format(header['version'][0]))
+
+        count = int(header['count'][0])
+        index_offset = int(header['index_offset'][0])
+
+        if count > 0:
+            self._data = np.memmap(self._file, dtype=np.uint8, mode='r')
+            self.index = np.frombuffer(
+                self._data, dtype=INDEX_DTYPE, count=count, offset=index_offset
+            )
+        else:
+            self._data = None
+            self.index = np.empty(0, dtype=INDEX_DTYPE)
+
+        self._positions = {name.decode(): k for k, name in enumerate(self.index['name'])}
+
+    def _map(self, size):
+        """ Returns the memory mapping of the file, covering at least a given size
+
+            @param size: Number of bytes from the start of the file to map
+            @return: Array of the bytes of the file
+        """
+        if self._data is None or len(self._data) < size:
+            self._file.flush()  # make the appended tracks visible to the mapping
+            self._data = np.memmap(self._file, dtype=np.uint8, mode='r')
+
+        return self._data
+
+
+def pack_directory(input_dir, library_path):
+    """ Converts a directory of exported tracks (YAML or npz files) to a library
+
+        The tracks are named after their files, without extension. If the library
+        already exists, the tracks are appended to it.
+
+        @param input_dir: Directory containing the exported tracks
+        @param library_path: Path of the library file
+        @return: [packed, errors]
+            - packed -> number of tracks added to the library
+            - errors -> dictionary of error messages, for the files that
+              couldn't be added
+    """
+    exporter = TrackExporter()
+    names = sorted(
+        name for name in os.listdir(input_dir)
+        if os.path.splitext(name)[1].lower() in ('.yaml', '.yml', '.npz')
+    )
+    errors = {}
+
+    with TrackLibrary(library_path, 'a') as library:
+        for name in names:
+            try:
+                track = exporter.load_track(os.path.join(input_dir, name))
+                library.append(
+                    os.path.splitext(name)[0], track['cones'],
+                    track['waypoints'], track['initial_pose']
+                )
+            except Exception as e:
+                errors[name] = str(e) or type(e).__name__
+
+    return len(names) - len(errors), errors
+
+
+def _make_header(count, index_offset):
+    """ Returns the header of a library file
+
+        @param count: Number of tracks in the library
+        @param index_offset: Position (in bytes) of the index in the file
+    """
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header['magic'] = MAGIC
+    header['version'] = VERSION
+    header['count'] = count
+    header['index_offset'] = index_offset
+
+    return header
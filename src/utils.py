@@ -2,50 +2,62 @@
     Definition of useful functions and classes
 """
 
+import numpy as np
 from src.config import AREA_WIDTH, CANVAS_WIDTH
 
 ##########################################
-## Distance conversion class
+## View transform class
 #
-class DistanceConverter(object):
-    """ Converts pixels to meters, and vice versa
-    """
-    # Static variables
-    zoom_ratio = 1.0
+class ViewTransform(object):
+    """ Converts spatial coordinates (in meters) to the pixel coordinates of a
+        view, and vice versa
 
-    def __init__(self):
-        self.pxl_to_m_ = float(AREA_WIDTH) / CANVAS_WIDTH
-        self.m_to_pxl_ = CANVAS_WIDTH / float(AREA_WIDTH)
+        Each view has its own zoom and offset. The conversions are applied
+        element-wise on whole arrays of coordinates at once.
+    """
+    ZOOM_STEP = 0.2  # zoom change of the zoom in and zoom out actions
+    MIN_ZOOM = 0.4
+    MAX_ZOOM = 2.0
 
-    def pxl_to_m(self, x):
-        """ Converts a length in pixels to a length in meters
+    def __init__(self, zoom=1.0, offset=(0.0, 0.0)):
+        """ @param zoom:   Zoom ratio of the view
+            @param offset: [x, y] -> pixel coordinates of the origin
         """
-        return float(x) * self.pxl_to_m_ / DistanceConverter.zoom_ratio
+        self.zoom = zoom
+        self.offset = np.array(offset, dtype=float)
+        self.scale = CANVAS_WIDTH / float(AREA_WIDTH)  # pixels per meter without zoom
+
+    def __repr__(self):
+        return "ViewTransform(zoom={}, offset={})".format(self.zoom, self.offset.tolist())
 
-    def m_to_pxl(self, x):
-        """ Converts a length in meters to a length in pixels
+    def m_to_pxl(self, points):
+        """ Converts spatial coordinates to pixel coordinates
+
+            @param points: (..., 2) array of coordinates (in meters)
+            @return: (..., 2) float array of coordinates (in pixels)
         """
-        return int(x * self.m_to_pxl_ * DistanceConverter.zoom_ratio)
+        return np.asarray(points, dtype=float) * (self.scale * self.zoom) + self.offset
 
-    @staticmethod
-    def zoom_in():
-        DistanceConverter.zoom_ratio += 0.2
+    def pxl_to_m(self, points):
+        """ Converts pixel coordinates to spatial coordinates
 
-        if DistanceConverter.zoom_ratio > 2.0:
-            DistanceConverter.zoom_ratio = 2.0
+            @param points: (..., 2) array of coordinates (in pixels)
+            @return: (..., 2) float array of coordinates (in meters)
+        """
+        return (np.asarray(points, dtype=float) - self.offset) / (self.scale * self.zoom)
 
-    @staticmethod
-    def zoom_out():
-        DistanceConverter.zoom_ratio -= 0.2
+    def length_to_pxl(self, length):
+        """ Converts lengths (a scalar or an array) in meters to lengths in pixels
+        """
+        return length * (self.scale * self.zoom)
 
-        if DistanceConverter.zoom_ratio < 0.4:
-            DistanceConverter.zoom_ratio = 0.4
+    def length_to_m(self, length):
+        """ Converts lengths (a scalar or an array) in pixels to lengths in meters
+        """
+        return length / (self.scale * self.zoom)
 
+    def zoom_in(self):
+        self.zoom = min(self.zoom + self.ZOOM_STEP, self.MAX_ZOOM)
 
-##########################################
-## Point class
-#
-class Point(object):
-    def __init__(self, x, y):
-        self.x = x  # spatial coordinates (in meters)
-        self.y = y
+    def zoom_out(self):
+        self.zoom = max(self.zoom - self.ZOOM_STEP, self.MIN_ZOOM)
@@ -1,90 +1,286 @@
 """
-    Definition of a class to handle movable waypoints
+    Definition of a set of movable waypoints, stored in arrays
 """
 
-from src.utils import DistanceConverter, Point
+import numpy as np
+from src.utils import ViewTransform
 
 
-class Waypoint(Point, DistanceConverter):
-    """ Handles movable waypoint GUI behaviour
+class WaypointSet(object):
+    """ Handles movable waypoints GUI behaviour
+
+        The coordinates, pixel positions and hovering states of the waypoints
+        are stored in contiguous arrays, so that they are updated for all the
+        waypoints at once (eg. after a zoom). Indexing the set returns
+        lightweight views of single waypoints.
+
+        The set can be edited like a list (see apply_edit), the inserted
+        waypoints being given by their [x, y] coordinates (in meters).
     """
-    def __init__(self, x=0.0, y=0.0, radius=1.0):
-        super().__init__(x, y)    # spatial coordinates (in meters)
-        DistanceConverter.__init__(self)
+    HOVER_SCALE = 1.5  # scale of the radius of the waypoints when they are hovered
+
+    def __init__(self, radius=1.0, transform=None, points=()):
+        """ @param radius: Radius (in pixels) of the waypoints
+            @param transform: Transform of the view in which the waypoints are
+                              drawn, a view without zoom nor offset if None
+            @param points: (N, 2) array of initial waypoints coordinates (in meters)
+        """
+        self.radius = radius
+        self.transform = ViewTransform() if transform is None else transform
 
-        self.pxl_x = self.m_to_pxl(x)  # canvas coordinates (in pixels)
-        self.pxl_y = self.m_to_pxl(y)
-        self.is_hovered = False  # whether the mouse is over the waypoint
+        # Arrays of the waypoints (with spare capacity at their end)
+        self._coords = np.empty((0, 2))            # spatial coordinates (in meters)
+        self._pxl = np.empty((0, 2))               # canvas coordinates (in pixels)
+        self._hovered = np.empty(0, dtype=bool)    # whether the mouse is over the waypoints
+        self._size = 0
 
-        self.base_radius = radius
-        self.radius = radius  # will change when the waypoint is being hovered
-        self.left   = self.pxl_x - self.radius  # bounding box coordinates
-        self.right  = self.pxl_x + self.radius
-        self.top    = self.pxl_y - self.radius
-        self.bottom = self.pxl_y + self.radius
+        self[:] = points
 
-    def is_colliding(self, x, y):
-        """ Checks whether a given canvas point is within the waypoint
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return (WaypointView(self, idx) for idx in range(self._size))
+
+    def __repr__(self):
+        return "WaypointSet({} waypoints)".format(self._size)
+
+    def __getitem__(self, idx):
+        return WaypointView(self, self._check_index(idx))
+
+    def __setitem__(self, idx, point):
+        """ Replaces a waypoint, or all of them with the slice [:]
+
+            @param idx: Index of the waypoint, or slice(None)
+            @param point: [x, y] coordinates (in meters) of the new waypoint,
+                          or (N, 2) array of the new waypoints
         """
-        return x >= self.left and x <= self.right \
-            and y >= self.top and y <= self.bottom
+        if isinstance(idx, slice):
+            if idx != slice(None):
+                raise TypeError("only the whole set of waypoints can be replaced")
 
-    def get_bounding_box(self):
-        """ Returns the waypoint bounding box
+            points = np.asarray(point, dtype=float).reshape(-1, 2)
+            self._size = 0
+            self._reserve(len(points))
+            self._size = len(points)
+            self._coords[:self._size] = points
+            self._pxl[:self._size] = self.transform.m_to_pxl(points)
+            self._hovered[:self._size] = False
+        else:
+            self._set(self._check_index(idx), point)
+
+    def __delitem__(self, idx):
+        idx = self._check_index(idx)
+
+        for array in (self._coords, self._pxl, self._hovered):
+            array[idx:self._size-1] = array[idx+1:self._size]
+
+        self._size -= 1
+
+    @property
+    def coords(self):
+        """ (N, 2) array of the waypoints coordinates (in meters)
+
+            The array is a view on the storage of the set, only valid until
+            the next insertion.
         """
-        return (self.left, self.top, self.right, self.bottom)
+        return self._coords[:self._size]
 
-    def update_hovering(self, x, y):
-        """ Updates whether the mouse is hovering the waypoint given mouse coordinates
+    @property
+    def pxl(self):
+        """ (N, 2) array of the waypoints canvas coordinates (in pixels)
+        """
+        return self._pxl[:self._size]
 
-            @return: Whether the hovering state has changed
+    @property
+    def hovered(self):
+        """ (N,) boolean array of whether the mouse is over the waypoints
+        """
+        return self._hovered[:self._size]
+
+    def insert(self, idx, point):
+        """ Inserts a waypoint before an index
+
+            @param idx: Index of the new waypoint
+            @param point: [x, y] coordinates (in meters) of the new waypoint
+        """
+        idx = min(max(idx + self._size if idx < 0 else idx, 0), self._size)
+        self._reserve(self._size + 1)
+
+        for array in (self._coords, self._pxl, self._hovered):
+            array[idx+1:self._size+1] = array[idx:self._size]
+
+        self._size += 1
+        self._set(idx, point)
+
+    def append(self, point):
+        self.insert(self._size, point)
+
+    def move(self, idx, x, y):
+        """ Updates the position of a waypoint given its spatial position
+        """
+        self._coords[idx] = (x, y)
+        self._pxl[idx] = self.transform.m_to_pxl(self._coords[idx])
+
+    def update_pxl_positions(self):
+        """ Computes the pixel positions of all the waypoints (eg. after a zoom)
+        """
+        self._pxl[:self._size] = self.transform.m_to_pxl(self.coords)
+
+    def get_radii(self, indices=None):
+        """ Returns the radii (in pixels) of waypoints, larger when hovered
+
+            @param indices: Indices of the waypoints (all of them if None)
+        """
+        hovered = self.hovered if indices is None else self._hovered[indices]
+
+        return self.radius * np.where(hovered, self.HOVER_SCALE, 1.0)
+
+    def get_bounding_boxes(self, indices=None):
+        """ Returns the bounding boxes of waypoints
+
+            @param indices: Indices of the waypoints (all of them if None)
+            @return: (N, 4) array of [left, top, right, bottom] coordinates (in pixels)
+        """
+        pxl = self.pxl if indices is None else self._pxl[indices]
+        radii = self.get_radii(indices)[:, np.newaxis]
+
+        return np.hstack((pxl - radii, pxl + radii))
+
+    def find_colliding(self, x, y, indices=None):
+        """ Finds the waypoints containing a canvas point
+
+            @param x: x coordinate (in pixels) of the point
+            @param y: y coordinate (in pixels) of the point
+            @param indices: Indices of the waypoints to check (all of them if None)
+            @return: Array of the indices of the waypoints containing the point
         """
-        if self.is_colliding(x, y):
-            if not self.is_hovered:
-                self.is_hovered = True
-                self.radius = 1.5 * self.base_radius
-                self._update_bounding_box()
+        if indices is None:
+            indices = np.arange(self._size)
+        else:
+            indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+
+        return indices[self._contains(x, y, indices)]
 
-                return True
+    def update_hovering(self, x, y, indices=None):
+        """ Updates whether the mouse is hovering waypoints given mouse coordinates
+
+            @param x: x coordinate (in pixels) of the mouse
+            @param y: y coordinate (in pixels) of the mouse
+            @param indices: Indices of the waypoints to update (all of them if None)
+            @return: Whether the hovering state of a waypoint has changed
+        """
+        if indices is None:
+            indices = np.arange(self._size)
         else:
-            if self.is_hovered:
-                self.is_hovered = False
-                self.radius = self.base_radius
-                self._update_bounding_box()
+            indices = np.asarray(indices, dtype=np.int64).reshape(-1)
 
-                return True
+        hovered = self._contains(x, y, indices)
+        changed = np.any(self._hovered[indices] != hovered)
+        self._hovered[indices] = hovered
 
-        return False
+        return bool(changed)
 
-    def update_position(self, x, y):
-        """ Updates the position of the waypoint given its spatial position
+    def _contains(self, x, y, indices):
+        """ Returns the (N,) boolean array of whether waypoints contain a point
         """
-        self.x = x
-        self.y = y
-        self.update_pxl_position()
+        boxes = self.get_bounding_boxes(indices)
+
+        return (boxes[:, 0] <= x) & (x <= boxes[:, 2]) & (boxes[:, 1] <= y) & (y <= boxes[:, 3])
 
-    def update_pxl_position(self):
-        """ Computes the pixel position of the waypoint and its bounding box
+    def _set(self, idx, point):
+        """ Replaces a waypoint by a new (not hovered) one
         """
-        self.pxl_x = self.m_to_pxl(self.x)
-        self.pxl_y = self.m_to_pxl(self.y)
-        self._update_bounding_box()
+        self.move(idx, *point)
+        self._hovered[idx] = False
+
+    def _check_index(self, idx):
+        """ Returns the positive index of a waypoint
 
-    def _update_bounding_box(self):
-        """ Updates the bounding box of the waypoint
+            @raise IndexError: If there is no such waypoint
         """
-        self.left   = self.pxl_x - self.radius
-        self.right  = self.pxl_x + self.radius
-        self.top    = self.pxl_y - self.radius
-        self.bottom = self.pxl_y + self.radius
+        if idx < 0:
+            idx += self._size
 
-    def __repr__(self):
-        return self._display()
+        if not 0 <= idx < self._size:
+            raise IndexError("waypoint index out of range")
+
+        return int(idx)
+
+    def _reserve(self, size):
+        """ Grows the arrays so that they can store a given number of waypoints
+        """
+        capacity = len(self._hovered)
+
+        if size <= capacity:
+            return
+
+        capacity = max(size, 2 * capacity, 16)
+
+        for name in ('_coords', '_pxl', '_hovered'):
+            array = getattr(self, name)
+            grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            setattr(self, name, grown)
+
+
+class WaypointView(object):
+    """ View of a single waypoint of a WaypointSet
+
+        The view refers to the waypoint by its index, and is only valid until
+        waypoints are inserted or deleted before it.
+    """
+    __slots__ = ('waypoints', 'index')
+
+    def __init__(self, waypoints, index):
+        self.waypoints = waypoints  # WaypointSet containing the waypoint
+        self.index = index
+
+    @property
+    def x(self):
+        return float(self.waypoints.coords[self.index, 0])
 
-    def __str__(self):
-        return self._display()
+    @property
+    def y(self):
+        return float(self.waypoints.coords[self.index, 1])
 
-    def _display(self):
-        """ Displays its coordinates
+    @property
+    def pxl_x(self):
+        return float(self.waypoints.pxl[self.index, 0])
+
+    @property
+    def pxl_y(self):
+        return float(self.waypoints.pxl[self.index, 1])
+
+    @property
+    def is_hovered(self):
+        return bool(self.waypoints.hovered[self.index])
+
+    @property
+    def radius(self):
+        return float(self.waypoints.get_radii([self.index])[0])
+
+    def get_bounding_box(self):
+        """ Returns the waypoint bounding box
+        """
+        return tuple(self.waypoints.get_bounding_boxes([self.index])[0].tolist())
+
+    def is_colliding(self, x, y):
+        """ Checks whether a given canvas point is within the waypoint
+        """
+        return len(self.waypoints.find_colliding(x, y, [self.index])) > 0
+
+    def update_hovering(self, x, y):
+        """ Updates whether the mouse is hovering the waypoint given mouse coordinates
+
+            @return: Whether the hovering state has changed
         """
+        return self.waypoints.update_hovering(x, y, [self.index])
+
+    def update_position(self, x, y):
+        """ Updates the position of the waypoint given its spatial position
+        """
+        self.waypoints.move(self.index, x, y)
+
+    def __repr__(self):
         return "({}, {})".format(self.x, self.y)
@@ -0,0 +1,119 @@
+"""
+    Definition of a spatial index of the waypoints, for hit-testing
+"""
+
+from math import floor
+import numpy as np
+
+
+class WaypointIndex(object):
+    """ Uniform grid of the waypoints in pixel space
+
+        Each waypoint is registered in all the cells overlapped by its largest
+        bounding box (when hovered), so that finding the waypoints under a point
+        only requires looking at the waypoints of its cell.
+    """
+    def __init__(self, cell_size, max_radius):
+        """ @param cell_size: Size (in pixels) of the cells of the grid
+            @param max_radius: Largest radius (in pixels) of a waypoint
+        """
+        self.cell_size = cell_size
+        self.max_radius = max_radius
+        self.waypoints = None  # indexed WaypointSet
+        self._cells = {}     # (i, j) -> set of indices of the waypoints in the cell
+        self._keys = []      # cells in which each waypoint is registered
+
+    def __len__(self):
+        return len(self._keys)
+
+    def rebuild(self, waypoints):
+        """ Indexes a new set of waypoints (after a zoom, deletion, ...)
+
+            @param waypoints: WaypointSet
+        """
+        self.waypoints = waypoints
+        self._cells = {}
+        self._keys = [
+            self._register(idx, *cell_range)
+            for idx, cell_range in enumerate(self._get_cell_ranges(waypoints.pxl).tolist())
+        ]
+
+    def add(self, idx):
+        """ Indexes a waypoint added at the end of the list
+
+            @param idx: Index of the waypoint (last one of the list)
+        """
+        if idx != len(self._keys):
+            raise IndexError("only the last waypoint can be added")
+
+        self._keys.append(self._register(idx, *self._get_cell_ranges(self.waypoints.pxl[idx])))
+
+    def remove(self, idx):
+        """ Removes the last waypoint from the index, after it has been deleted
+
+            @param idx: Index of the deleted waypoint (last one of the list)
+        """
+        if idx != len(self._keys) - 1:
+            raise IndexError("only the last waypoint can be removed")
+
+        self._unregister(idx)
+        del self._keys[idx]
+
+    def update(self, idx):
+        """ Updates the position of a waypoint in the index, after it moved
+
+            @param idx: Index of the waypoint
+        """
+        self._unregister(idx)
+        self._keys[idx] = self._register(idx, *self._get_cell_ranges(self.waypoints.pxl[idx]))
+
+    def query(self, x, y, exclude=None):
+        """ Returns the waypoints containing a point
+
+            @param x: x coordinate (in pixels) of the point
+            @param y: y coordinate (in pixels) of the point
+            @param exclude: Index of a waypoint to ignore
+            @return: Sorted list of the indices of the waypoints containing the point
+        """
+        key = (floor(x / self.cell_size), floor(y / self.cell_size))
+        candidates = [idx for idx in self._cells.get(key, ()) if idx != exclude]
+
+        return sorted(self.waypoints.find_colliding(x, y, candidates).tolist())
+
+    def _get_cell_ranges(self, positions):
+        """ Computes the ranges of cells overlapped by the largest bounding boxes
+            of waypoints
+
+            @param positions: (N, 2) array of the waypoints pixel positions, or
+                              a single position
+            @return: (N, 4) array (or a list for a single position) of
+                     [i_min, i_max, j_min, j_max] -> indices of the cells
+        """
+        positions = np.asarray(positions, dtype=float)
+        bounds = positions[..., [0, 0, 1, 1]] + [-self.max_radius, self.max_radius,
+                                                   -self.max_radius, self.max_radius]
+        ranges = np.floor(bounds / self.cell_size).astype(np.int64)
+
+        return ranges.tolist() if ranges.ndim == 1 else ranges
+
+    def _register(self, idx, i_min, i_max, j_min, j_max):
+        """ Adds a waypoint to the cells overlapped by its largest bounding box
+
+            @return: List of the keys of these cells
+        """
+        keys = [(i, j) for i in range(i_min, i_max + 1) for j in range(j_min, j_max + 1)]
+
+        for key in keys:
+            self._cells.setdefault(key, set()).add(idx)
+
+        return keys
+
+    def _unregister(self, idx):
+        """ Removes a waypoint from the cells in which it is registered
+        """
+        for key in self._keys[idx]:
+            cell = self._cells[key]
+            cell.discard(idx)
+
+            if not cell:
+                del self._cells[key]
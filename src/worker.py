@@ -0,0 +1,120 @@
+"""
+    Definition of a background worker running the latest submitted job
+"""
+
+import queue
+import threading
+
+
+class Worker(object):
+    """ Runs jobs in a background thread
+
+        Each submitted job is given a generation number. A job waiting to be
+        run is replaced by the next submitted one, and the results of the jobs
+        older than the latest one are dropped, so that only finished and
+        current results are returned.
+
+        The results are collected by polling from the thread owning the
+        worker (eg. the Tk main loop, which can't be called from another thread).
+    """
+    def __init__(self):
+        self.generation = 0  # generation of the latest submitted job
+        self.finished = 0    # generation of the latest finished job
+        self.dropped = 0     # number of jobs replaced or finished too late
+
+        self._condition = threading.Condition()
+        self._job = None       # [generation, function] -> job waiting to be run
+        self._done = 0         # generation of the latest job run by the thread
+        self._stopped = False
+        self._results = queue.Queue()  # [generation, output, exception] of finished jobs
+        self._thread = threading.Thread(target=self._run, name="worker", daemon=True)
+        self._thread.start()
+
+    def __repr__(self):
+        return "Worker(generation {}, {} dropped)".format(self.generation, self.dropped)
+
+    def is_busy(self):
+        """ Returns whether the latest submitted job hasn't finished yet
+        """
+        return self.finished < self.generation
+
+    def submit(self, function):
+        """ Submits a job, replacing the one waiting to be run if any
+
+            @param function: Function without argument to run in the background
+            @return: Generation number of the job
+        """
+        with self._condition:
+            if self._job is not None:
+                self.dropped += 1
+
+            self.generation += 1
+            self._job = (self.generation, function)
+            self._condition.notify()
+
+        return self.generation
+
+    def poll(self):
+        """ Collects the results of the finished jobs
+
+            An exception raised by the latest job is raised again here.
+
+            @return: Output of the latest job if it finished since the last
+                     call, None otherwise
+        """
+        output = None
+
+        while True:
+            try:
+                generation, result, exception = self._results.get_nowait()
+            except queue.Empty:
+                return output
+
+            self.finished = max(self.finished, generation)
+
+            if generation != self.generation:
+                self.dropped += 1
+            elif exception is not None:
+                raise exception
+            else:
+                output = result
+
+    def wait(self):
+        """ Waits for the latest submitted job to finish
+
+            Its result is then collected with poll.
+        """
+        with self._condition:
+            while self._done < self.generation and not self._stopped:
+                self._condition.wait()
+
+    def stop(self):
+        """ Stops the thread once its current job is done
+        """
+        with self._condition:
+            self._stopped = True
+            self._job = None
+            self._condition.notify()
+
+    def _run(self):
+        """ Main loop of the thread
+        """
+        while True:
+            with self._condition:
+                while self._job is None and not self._stopped:
+                    self._condition.wait()
+
+                if self._stopped:
+                    return
+
+                generation, function = self._job
+                self._job = None
+
+            try:
+                self._results.put((generation, function(), None))
+            except Exception as exception:
+                self._results.put((generation, None, exception))
+
+            with self._condition:
+                self._done = generation
+                self._condition.notify_all()
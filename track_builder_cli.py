@@ -0,0 +1,172 @@
+#!/usr/bin/python3
+"""
+    Command line interface to generate Formula Student tracks without display
+
+    Corentin Chauvin-Hameau - 2020
+"""
+
+##########################################
+## Imports
+#
+import argparse
+import sys
+import time
+from src.config import *
+
+# The modules of the commands are imported by the commands themselves, so that
+# the processes only load the dependencies (numpy, scipy, ...) they use
+
+
+##########################################
+## Commands
+#
+def build_command(args):
+    """ Generates the cones and starting poses of a directory of waypoints files
+    """
+    from src.headless import TrackParameters, process_directory
+
+    parameters = TrackParameters(
+        spacing=args.spacing, std_spacing=args.std_spacing,
+        orange_spacing=args.orange_spacing, track_width=args.width,
+        close_loop=args.close_loop, offset_x=args.offset_x, offset_y=args.offset_y,
+        offset_yaw=args.offset_yaw, seed=args.seed, validate=args.validate
+    )
+    exported, errors, duration = process_directory(
+        args.input_dir, args.output_dir, parameters, args.jobs, args.format
+    )
+
+    for name in sorted(errors):
+        print("Failed to process {}: {}".format(name, errors[name]), file=sys.stderr)
+
+    rate = exported / duration if duration > 0 else 0.0
+    print("Exported {} tracks in {:.2f} s ({:.1f} tracks/s)".format(exported, duration, rate))
+
+    return 1 if errors else 0
+
+
+def random_command(args):
+    """ Generates random valid closed tracks, and exports them
+    """
+    from src.headless import TrackParameters, export_tracks
+    from src.track_generator import generate_tracks
+
+    parameters = TrackParameters(
+        spacing=args.spacing, std_spacing=args.std_spacing,
+        orange_spacing=args.orange_spacing, track_width=args.width,
+        close_loop=True, offset_x=args.offset_x, offset_y=args.offset_y,
+        offset_yaw=args.offset_yaw, seed=args.seed
+    )
+
+    start = time.perf_counter()
+    tracks, attempts = generate_tracks(
+        args.count, args.jobs, args.seed, args.max_attempts, turning_radius=args.turning_radius,
+        min_length=args.min_length, max_length=args.max_length, track_width=args.width
+    )
+    paths = export_tracks(tracks, args.output_dir, parameters, track_format=args.format)
+    duration = time.perf_counter() - start
+
+    rate = len(paths) / duration if duration > 0 else 0.0
+    print("Generated {} of {} tracks ({} candidates) in {:.2f} s ({:.1f} tracks/s)".format(
+        len(paths), args.count, attempts, duration, rate
+    ))
+
+    if len(paths) < args.count:
+        print("Too many rejected candidates, try to relax the constraints or to increase "
+              "--max-attempts", file=sys.stderr)
+        return 1
+
+    return 0
+
+
+def pack_command(args):
+    """ Converts a directory of exported tracks to a track library
+    """
+    from src.track_library import pack_directory
+
+    start = time.perf_counter()
+    packed, errors = pack_directory(args.input_dir, args.library)
+    duration = time.perf_counter() - start
+
+    for name in sorted(errors):
+        print("Failed to pack {}: {}".format(name, errors[name]), file=sys.stderr)
+
+    print("Packed {} tracks in {:.2f} s".format(packed, duration))
+
+    return 1 if errors else 0
+
+
+def add_track_arguments(parser, close_loop=True):
+    """ Adds the arguments defining the parameters of the tracks
+
+        @param parser: Parser of the command
+        @param close_loop: Whether to add the option to close the loop
+    """
+    parser.add_argument('--spacing', type=float, default=DEFAULT_SPACING_CONES,
+                        help="distance between two consecutive cones (m)")
+    parser.add_argument('--std-spacing', type=float, default=0.0,
+                        help="randomisation of the cones spacing (m)")
+    parser.add_argument('--orange-spacing', type=float, default=DEFAULT_SPACING_ORANGE,
+                        help="distance between orange cones (m)")
+    parser.add_argument('--width', type=float, default=TRACK_WIDTH, help="track width (m)")
+    if close_loop:
+        parser.add_argument('--close-loop', action='store_true', help="close the loop")
+    parser.add_argument('--offset-x', type=float, default=INIT_OFFSET_X,
+                        help="longitudinal offset on the initial pose (m)")
+    parser.add_argument('--offset-y', type=float, default=INIT_OFFSET_Y,
+                        help="lateral offset on the initial pose (m)")
+    parser.add_argument('--offset-yaw', type=float, default=INIT_OFFSET_YAW,
+                        help="yaw offset on the initial pose (degrees)")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="seed of the cones randomisation")
+    parser.add_argument('--format', choices=[YAML_TRACK_FORMAT, BINARY_TRACK_FORMAT],
+                        default=DEFAULT_TRACK_FORMAT, help="format of the exported tracks")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="number of processes (default: number of CPUs)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    build_parser = subparsers.add_parser(
+        'build', help="generate cones and starting poses from waypoints YAML files"
+    )
+    build_parser.add_argument('input_dir', help="directory of waypoints YAML files")
+    build_parser.add_argument('output_dir', help="directory in which to export the tracks")
+    add_track_arguments(build_parser)
+    build_parser.add_argument('--validate', action='store_true',
+                              help="reject the tracks whose sides overlap")
+    build_parser.set_defaults(function=build_command)
+
+    random_parser = subparsers.add_parser(
+        'random', help="generate random valid closed tracks"
+    )
+    random_parser.add_argument('output_dir', help="directory in which to export the tracks")
+    random_parser.add_argument('-n', '--count', type=int, default=10,
+                               help="number of tracks to generate")
+    random_parser.add_argument('--turning-radius', type=float, default=DEFAULT_TURNING_RADIUS,
+                               help="minimum turning radius of the center line (m)")
+    random_parser.add_argument('--min-length', type=float, default=DEFAULT_MIN_TRACK_LENGTH,
+                               help="minimum length of the tracks (m)")
+    random_parser.add_argument('--max-length', type=float, default=DEFAULT_MAX_TRACK_LENGTH,
+                               help="maximum length of the tracks (m)")
+    random_parser.add_argument('--max-attempts', type=int, default=None,
+                               help="maximum number of candidates to propose (default: {} per "
+                                    "track)".format(DEFAULT_ATTEMPTS_PER_TRACK))
+    add_track_arguments(random_parser, close_loop=False)
+    random_parser.set_defaults(function=random_command)
+
+    pack_parser = subparsers.add_parser(
+        'pack', help="convert a directory of exported tracks to a track library"
+    )
+    pack_parser.add_argument('input_dir', help="directory of exported tracks (YAML or npz)")
+    pack_parser.add_argument('library', help="library file (tracks are appended if it exists)")
+    pack_parser.set_defaults(function=pack_command)
+
+    args = parser.parse_args(argv)
+    return args.function(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
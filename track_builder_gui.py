@@ -8,35 +8,60 @@
 ##########################################
 ## Imports
 #
+import os
+import time
+from collections import OrderedDict
 from math import cos, sin, radians
+import numpy as np
 import tkinter as tk
 from tkinter import ttk
 from src.config import *
-from src.utils import DistanceConverter, Point
-from src.waypoint import Waypoint
+from src.utils import ViewTransform
+from src.waypoint import WaypointSet
 from src.track_builder import TrackBuilder
 from src.track_exporter import TrackExporter
 from src.sliders import OffsetSlider, BasicSlider
+from src.pipeline import Pipeline
+from src.edit_journal import EditJournal, apply_edit
+from src.canvas_items import CanvasItems
+from src.waypoint_index import WaypointIndex
+from src.lod import simplify_polyline, clip_polyline, points_in_box
+from src.worker import Worker
+from src.timing import Timings, get_timing_settings
 
 ##########################################
 ## Class TrackBuilderGUI
 #
-class TrackBuilderGUI(tk.Frame, TrackBuilder, TrackExporter, DistanceConverter):
+class TrackBuilderGUI(tk.Frame, TrackBuilder, TrackExporter):
     """
     """
+    CENTER_LINE_STYLE = {'fill': 'blue', 'width': 1, 'dash': (5, 10)}
+    SHARP_TURN_STYLE = {'fill': 'red', 'width': 2, 'dash': ()}
+
     def __init__(self, parent=None):
         tk.Frame.__init__(self, parent)
         TrackBuilder.__init__(self)
         TrackExporter.__init__(self)
-        DistanceConverter.__init__(self)
 
         self.winfo_toplevel().title("Track builder")
 
         # Initialise diverse variables
         self.action_state = ADD_STATE
-        self.waypoints = []
+        self.transform = ViewTransform()  # conversion between meters and canvas pixels
+        self.waypoints = WaypointSet(WAYPOINTS_RADIUS, self.transform)
+        self.waypoint_index = WaypointIndex(  # spatial index of the waypoints, for hit-testing
+            4 * WAYPOINTS_RADIUS, WaypointSet.HOVER_SCALE * WAYPOINTS_RADIUS
+        )
+        self.hovered_wp_idx = set()  # indices of the hovered waypoints
+        self.waypoint_index.rebuild(self.waypoints)
         self.is_dragging = False    # Whether a waypoint is being dragged (ie moved)
         self.dragged_wp_idx = None  # Index of the dragged waypoint
+        self.drag_start = None      # [x, y] -> position of the dragged waypoint before the drag
+        self.journal = EditJournal()  # history of the edits of the waypoints
+        self._update_job = None   # scheduled update of the window
+        self._last_update = 0.0   # time of the last update of the window (in s)
+        self.worker = Worker() if BACKGROUND_PIPELINE else None  # thread computing the geometry
+        self._poll_job = None     # scheduled collection of the results of the worker
         self.close_loop = False     # Whether to close the loop
         self.cones_spacing = DEFAULT_SPACING_CONES
         self.orange_spacing = DEFAULT_SPACING_ORANGE
@@ -48,6 +73,9 @@ class TrackBuilderGUI(tk.Frame, TrackBuilder, TrackExporter, DistanceConverter):
         self.initial_pose_offset['y'] = INIT_OFFSET_Y
         self.initial_pose_offset['yaw'] = radians(INIT_OFFSET_YAW)
         self.turning_radius = DEFAULT_TURNING_RADIUS  # Maximum turning radius (in m)
+        timing_enabled, self.timing_report_path = get_timing_settings()
+        self.timings = Timings() if timing_enabled else None  # durations of the updates
+        self._build_pipeline()
 
         # Initialise window
         self.pack(fill=tk.BOTH, expand=True)
@@ -77,6 +105,15 @@ class TrackBuilderGUI(tk.Frame, TrackBuilder, TrackExporter, DistanceConverter):
         separator = ttk.Separator(self.top_frame1, orient=tk.VERTICAL)
         separator.pack(side=tk.LEFT, fill="y", padx=5)
 
+        undo_button = tk.Button(self.top_frame1, text="Undo", command=self._undo_cb)
+        undo_button.pack(side=tk.LEFT)
+
+        redo_button = tk.Button(self.top_frame1, text="Redo", command=self._redo_cb)
+        redo_button.pack(side=tk.LEFT)
+
+        separator = ttk.Separator(self.top_frame1, orient=tk.VERTICAL)
+        separator.pack(side=tk.LEFT, fill="y", padx=5)
+
         zoom_out_button = tk.Button(self.top_frame1, text="Zoom out", command=self._zoom_out_button_cb)
         zoom_out_button.pack(side=tk.LEFT)
 
@@ -101,6 +138,14 @@ class TrackBuilderGUI(tk.Frame, TrackBuilder, TrackExporter, DistanceConverter):
         close_loop_check.pack(side=tk.LEFT)
         self.close_loop_var.trace('w', self._close_loop_cb)
 
+        self.local_interpolation_var = tk.IntVar()
+        self.local_interpolation_var.set(int(self.interpolation == CATMULL_ROM_INTERPOLATION))
+        local_interpolation_check = tk.Checkbutton(
+            self.top_frame2, text=" Local interpolation", variable=self.local_interpolation_var
+        )
+        local_interpolation_check.pack(side=tk.LEFT)
+        self.local_interpolation_var.trace('w', self._local_interpolation_cb)
+
         separator = ttk.Separator(self.top_frame2, orient=tk.VERTICAL)
         separator.pack(side=tk.LEFT, fill="y", padx=5)
 
@@ -129,7 +174,7 @@ class TrackBuilderGUI(tk.Frame, TrackBuilder, TrackExporter, DistanceConverter):
 
         random_spacing_lbl = tk.Label(self.top_frame2, text="Randomisation of cones spacing (m):")
         random_spacing_lbl.pack(side=tk.LEFT)
-        self.random_spacing_slider = BasicSlider(0.0, [0.0, 1.0], 0.01, self, self.top_frame2)
+        self.random_spacing_slider = BasicSlider(0.0, [0.0, 1.0], 0.01, self, self.top_frame2, 'cones')
 
         # Third row of widgets
         self.turning_radius_var = tk.StringVar()
@@ -162,13 +207,14 @@ class TrackBuilderGUI(tk.Frame, TrackBuilder, TrackExporter, DistanceConverter):
 
         self.x_scrollbar = tk.Scrollbar(self, orient=tk.HORIZONTAL)
         self.x_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
-        self.x_scrollbar.config(command=self.canvas.xview)
+        self.x_scrollbar.config(command=self._xview_cb)
         self.y_scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL)
         self.y_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.y_scrollbar.config(command=self.canvas.yview)
+        self.y_scrollbar.config(command=self._yview_cb)
 
         self.canvas.config(xscrollcommand=self.x_scrollbar.set, yscrollcommand=self.y_scrollbar.set)
         self.canvas.pack(fill=tk.BOTH, expand=True)
+        self._create_canvas_items()
 
         # Declare window events
         self.canvas.bind("<Motion>", self._mouse_motion_cb)
@@ -179,70 +225,442 @@ class TrackBuilderGUI(tk.Frame, TrackBuilder, TrackExporter, DistanceConverter):
         self.canvas.bind("<Button-5>", self._mouse_scroll_down_cb)
         self.canvas.bind("<Shift-Button-4>", self._mouse_scroll_left_cb)
         self.canvas.bind("<Shift-Button-5>", self._mouse_scroll_right_cb)
+        self.canvas.bind("<Configure>", lambda event: self.request_update('draw'))
+        self.canvas.bind("<Control-z>", self._undo_cb)
+        self.canvas.bind("<Control-y>", self._redo_cb)
+        self.canvas.bind("<Control-Z>", self._redo_cb)
         self.canvas.focus_set()  # give focus to the canvas so that it captures key events
+        self.winfo_toplevel().protocol("WM_DELETE_WINDOW", self._quit_cb)
+
+        # Restore the waypoints of a crashed session
+        if AUTOSAVE_PATH is not None:
+            points = self.journal.open(os.path.expanduser(AUTOSAVE_PATH))
 
-    def update_window(self):
-        """ Draw all the objects in the window again
+            if points != []:
+                self.waypoints[:] = points
+                self._index_waypoints()
+                self.update_window('center')
+
+    def update_window(self, *stages):
+        """ Updates the window after a change of some inputs
+
+            Only the stages of the pipeline depending on these inputs are
+            computed again, before drawing all the objects in the window again.
+            If BACKGROUND_PIPELINE is set, the geometry stages are computed in
+            the background thread, and the window is updated once they finish.
+
+            @param stages: Names of the pipeline stages whose inputs changed
+                           ('center', 'sides', 'cones', 'overlaps', 'start_pose',
+                           'lod' or 'draw')
         """
-        self.canvas.delete(tk.ALL)
+        if self._update_job is not None:
+            self.after_cancel(self._update_job)
+            self._update_job = None
 
-        # Draw the waypoints
-        for wp in self.waypoints:
-            self.canvas.create_oval(wp.get_bounding_box(), fill='red')
+        self._last_update = time.perf_counter()
+        self.pipeline.invalidate(*stages)
 
-        # Update and draw the center line
-        center_points, curvatures = self.compute_center_points(self.waypoints, self.close_loop)
-        if center_points == []:
-            self.cones = {}
-            return
-        self._draw_center_line(center_points, curvatures)
+        if self.worker is not None:
+            self._submit_geometry()
+
+        self.pipeline.run()
+
+        if self.timings is not None:
+            self.timings.record('update', time.perf_counter() - self._last_update)
+
+            if TIMING_OVERLAY:
+                self._draw_timings()
+
+        if DEBUG_PIPELINE:
+            print("Update #{}: {}".format(
+                self.pipeline.updates, ", ".join(self.pipeline.last_run) or "-"
+            ))
 
-        # Update and draw sides
-        left_points, right_points = self.compute_side_points(TRACK_WIDTH)
-        if left_points == [] or right_points == []:
-            self.cones = {}
+    def request_update(self, *stages):
+        """ Schedules an update of the window after a change of some inputs
+
+            The requests received before the update runs are merged, and the
+            updates are spaced by at least 1/REDRAW_FPS. Since the stages read
+            their inputs when they are run, only the latest values are used.
+
+            @param stages: Names of the pipeline stages whose inputs changed
+                           (see update_window)
+        """
+        self.pipeline.invalidate(*stages)
+
+        if self._update_job is None:
+            delay = self._last_update + 1.0/REDRAW_FPS - time.perf_counter()
+            self._update_job = self.after(max(0, int(1000*delay)), self.update_window)
+
+    def _submit_geometry(self):
+        """ Sends the dirty geometry stages to the background thread
+
+            The stages still awaited from a previous job are computed again,
+            since the result of this job will be dropped.
+        """
+        if not any(self.pipeline.is_dirty(name) for name in self.geometry_stages):
             return
-        self.canvas.create_line(left_points, smooth=True, fill='green', width=1.5)
-        self.canvas.create_line(right_points, smooth=True, fill='green', width=1.5)
-
-        # Update and draw cones
-        cones_spacing_randomisation = self.random_spacing_slider.get_value()
-        cones = self.compute_cones(
-            self.cones_spacing, cones_spacing_randomisation,
-            self.orange_spacing, self.close_loop
+
+        stages = [
+            name for name in self.geometry_stages
+            if self.pipeline.is_dirty(name) or self.pipeline.is_deferred(name)
+        ]
+        inputs = self._get_inputs()
+        self.pipeline.defer(*stages)
+        self.worker.submit(lambda: self._compute_geometry(stages, inputs))
+
+        if self._poll_job is None:
+            self._poll_job = self.after(WORKER_POLL_PERIOD, self._poll_worker)
+
+    def _compute_geometry(self, stages, inputs):
+        """ Computes geometry stages (in the background thread)
+
+            @param stages: Names of the stages to compute, in the pipeline order
+            @param inputs: Copy of the inputs of the stages (see _get_inputs)
+            @return: Ordered dictionary of the outputs of the stages
+        """
+        outputs = OrderedDict()
+
+        for name in stages:
+            if self.timings is None:
+                outputs[name] = self.geometry_stages[name][0](inputs)
+            else:
+                with self.timings.measure(name):
+                    outputs[name] = self.geometry_stages[name][0](inputs)
+
+        return outputs
+
+    def _poll_worker(self):
+        """ Collects the geometry computed in the background thread
+
+            The result is only drawn if no input changed since it has been
+            requested, otherwise the next job will replace it.
+        """
+        self._poll_job = None
+        outputs = self.worker.poll()
+
+        if outputs is not None and \
+                not any(self.pipeline.is_dirty(name) for name in self.geometry_stages):
+            for name, output in outputs.items():
+                self.pipeline.complete(name, output)
+
+            self.update_window()
+        elif self.worker.is_busy():
+            self._poll_job = self.after(WORKER_POLL_PERIOD, self._poll_worker)
+
+    def _finish_geometry(self):
+        """ Runs the pending update of the window, and waits for the geometry
+            computed in the background thread (eg. before exporting the track)
+        """
+        if self._update_job is not None or \
+                any(self.pipeline.is_dirty(name) for name in self.geometry_stages):
+            self.update_window()
+
+        if self.worker is not None and self.worker.is_busy():
+            if self._poll_job is not None:
+                self.after_cancel(self._poll_job)
+
+            self.worker.wait()
+            self._poll_worker()
+
+    def _get_inputs(self):
+        """ Copies the inputs of the geometry stages, so that they can be
+            computed in the background thread while the GUI modifies them
+
+            @return: Dictionary of the inputs
+        """
+        return {
+            'waypoints': self._get_waypoints_array(),
+            'changed_idx': self.dragged_wp_idx if self.is_dragging else None,
+            'close_loop': self.close_loop,
+            'cones_spacing': self.cones_spacing,
+            'spacing_randomisation': self.random_spacing_slider.get_value(),
+            'orange_spacing': self.orange_spacing,
+            'initial_pose_offset': dict(self.initial_pose_offset),
+        }
+
+    def _build_pipeline(self):
+        """ Declares the stages of the pipeline, and their dependencies
+        """
+        self.pipeline = Pipeline()
+        self.pipeline.timings = self.timings
+
+        # Stages computing the geometry of the track from a copy of their inputs,
+        # possibly in the background thread: name -> [function, dependencies]
+        self.geometry_stages = OrderedDict([
+            ('center', (self._center_stage, [])),
+            ('sides', (self._sides_stage, ['center'])),
+            ('cones', (self._cones_stage, ['sides'])),
+            ('overlaps', (self._overlaps_stage, ['sides'])),
+            ('start_pose', (self._start_pose_stage, ['center'])),
+        ])
+
+        for name, (function, dependencies) in self.geometry_stages.items():
+            self.pipeline.add_stage(
+                name, lambda function=function: function(self._get_inputs()), dependencies
+            )
+
+        self.pipeline.add_stage('lod', self._lod_stage, ['center', 'sides'])
+        self.pipeline.add_stage(
+            'draw', self._draw_stage, ['center', 'sides', 'cones', 'overlaps', 'start_pose', 'lod']
+        )
+
+    def _center_stage(self, inputs):
+        """ Updates the center line (inputs: waypoints, close loop, interpolation)
+        """
+        return self.compute_center_points(
+            inputs['waypoints'], inputs['close_loop'], inputs['changed_idx']
         )
-        radius = self.m_to_pxl(CONE_RADIUS)
-
-        for color in self.cones:
-            for cone in cones[color]:
-                x = self.m_to_pxl(cone.x)
-                y = self.m_to_pxl(cone.y)
-                self.canvas.create_oval([x-radius, y-radius, x+radius, y+radius], fill=color)
-
-        # Update and draw starting position
-        self.initial_pose = self.compute_start_pose(self.waypoints, self.initial_pose_offset)
-        x1 = self.m_to_pxl(self.initial_pose[0])
-        y1 = self.m_to_pxl(self.initial_pose[1])
-        x2 = x1 + 20*cos(self.initial_pose[2])
-        y2 = y1 + 20*sin(self.initial_pose[2])
-        self.canvas.create_line(x1, y1, x2, y2, arrow=tk.LAST, arrowshape="8 10 5", width=5, fill="red")
-
-    def _draw_center_line(self, center_points, curvatures):
+
+    def _sides_stage(self, inputs):
+        """ Updates the sides of the track
+        """
+        return self.compute_side_points(TRACK_WIDTH)
+
+    def _cones_stage(self, inputs):
+        """ Updates the cones (inputs: cones spacing and its randomisation,
+            orange cones spacing)
+        """
+        return self.compute_cones(
+            inputs['cones_spacing'], inputs['spacing_randomisation'],
+            inputs['orange_spacing'], inputs['close_loop']
+        )
+
+    def _overlaps_stage(self, inputs):
+        """ Finds the parts of the sides crossing or getting too close to another one
+        """
+        return self.compute_overlaps(inputs['close_loop'])
+
+    def _start_pose_stage(self, inputs):
+        """ Updates the starting pose (inputs: initial pose offsets)
+        """
+        if len(self.center_points) > 0:
+            self.initial_pose = self.compute_start_pose(
+                inputs['waypoints'][:1], inputs['initial_pose_offset']
+            )
+
+        return self.initial_pose
+
+    def _create_canvas_items(self):
+        """ Declares the groups of items drawn on the canvas
+
+            The groups are stacked in the order they are declared (the first
+            one at the bottom).
+        """
+        self.canvas_items = OrderedDict()
+        self.canvas_items['waypoints'] = CanvasItems(self.canvas, 'oval', 'waypoints', fill='red')
+        self.canvas_items['center'] = CanvasItems(self.canvas, 'line', 'center', smooth=True)
+        self.canvas_items['sides'] = CanvasItems(
+            self.canvas, 'line', 'sides', smooth=True, fill='green', width=1.5
+        )
+        self.canvas_items['overlaps'] = CanvasItems(
+            self.canvas, 'line', 'overlaps', fill='magenta', width=4
+        )
+
+        for color in ['blue', 'yellow', 'orange']:
+            self.canvas_items[color] = CanvasItems(self.canvas, 'oval', color, fill=color)
+
+        self.canvas_items['start_pose'] = CanvasItems(
+            self.canvas, 'line', 'start_pose', arrow=tk.LAST, arrowshape="8 10 5",
+            width=5, fill="red"
+        )
+        self.canvas_items['timings'] = CanvasItems(
+            self.canvas, 'text', 'timings', anchor=tk.NW, font='TkFixedFont'
+        )
+
+    def _lod_stage(self):
+        """ Simplifies the center line and the sides at the current zoom level
+            (inputs: zoom, turning radius)
+
+            The polylines are simplified in pixels, so that the removed points
+            are never further than LOD_TOLERANCE from the drawn lines.
+
+            @return: Dictionary of the simplified polylines (in pixels)
+                - 'center' -> list of [points, too_sharp], for each run of
+                  consecutive segments with the same curvature state
+                - 'sides' -> list of the arrays of points of each side
+        """
+        center_points, curvatures = self.pipeline.outputs['center']
+        runs = []
+
+        if len(center_points) >= 2:
+            pxl_points = self.transform.m_to_pxl(center_points)
+            too_sharp = np.abs(curvatures[:-1]) > 1.0 / self.turning_radius
+
+            # Runs of segments with the same color
+            starts = np.flatnonzero(np.diff(too_sharp, prepend=not too_sharp[0]))
+            ends = np.append(starts[1:], len(too_sharp))
+            runs = [
+                [simplify_polyline(pxl_points[start:end+1], LOD_TOLERANCE), too_sharp[start]]
+                for start, end in zip(starts.tolist(), ends.tolist())
+            ]
+
+        sides = [
+            simplify_polyline(self.transform.m_to_pxl(side_points), LOD_TOLERANCE)
+            for side_points in self.pipeline.outputs['sides']
+        ]
+
+        return {'center': runs, 'sides': sides}
+
+    def _draw_stage(self):
+        """ Updates the objects drawn in the window (inputs: hovering, scrolling)
+
+            The canvas items are updated in place, and only the ones that
+            changed are modified. Only the objects in the visible part of the
+            canvas (and a margin of VIEW_MARGIN around it) are drawn.
+        """
+        items = self.canvas_items
+        view_box = self._get_view_box()
+
+        # Draw the waypoints
+        visible = points_in_box(
+            self.waypoints.pxl, view_box, WaypointSet.HOVER_SCALE * WAYPOINTS_RADIUS
+        )
+        created = items['waypoints'].update(
+            self.waypoints.get_bounding_boxes(visible), keys=visible.tolist()
+        )
+
+        if len(self.pipeline.outputs['center'][0]) == 0:
+            for name in items:
+                if name not in ('waypoints', 'timings'):
+                    items[name].clear()
+            return
+
+        # Draw the center line
+        created |= self._draw_center_line(self.pipeline.outputs['lod']['center'], view_box)
+
+        # Draw sides
+        created |= items['sides'].update([
+            part for side in self.pipeline.outputs['lod']['sides']
+            for part in clip_polyline(side, view_box)
+        ])
+
+        # Highlight overlapping parts of the sides
+        overlaps = np.vstack([
+            self.transform.m_to_pxl(
+                np.stack([side[segments], side[segments + 1]], axis=1)
+            ).reshape(-1, 4)
+            for side, segments in zip(self.pipeline.outputs['sides'],
+                                      self.pipeline.outputs['overlaps'])
+        ])
+        lows = np.minimum(overlaps[:, :2], overlaps[:, 2:])
+        highs = np.maximum(overlaps[:, :2], overlaps[:, 2:])
+        visible = np.all((highs >= view_box[:2]) & (lows <= view_box[2:]), axis=1)
+        created |= items['overlaps'].update(overlaps[visible])
+
+        # Draw cones
+        cones = self.pipeline.outputs['cones']
+        radius = self.transform.length_to_pxl(CONE_RADIUS)
+
+        for color in ['blue', 'yellow', 'orange']:
+            pxl_cones = self.transform.m_to_pxl(cones.get(color, np.empty((0, 2))))
+            visible = points_in_box(pxl_cones, view_box, radius)
+            created |= items[color].update(
+                np.hstack([pxl_cones[visible] - radius, pxl_cones[visible] + radius]),
+                keys=visible.tolist()
+            )
+
+        # Draw starting position
+        initial_pose = self.pipeline.outputs['start_pose']
+        x1, y1 = self.transform.m_to_pxl(initial_pose[:2]).tolist()
+        x2 = x1 + 20*cos(initial_pose[2])
+        y2 = y1 + 20*sin(initial_pose[2])
+        created |= items['start_pose'].update([[x1, y1, x2, y2]])
+
+        # New items are drawn on top of the others, restore the stacking order
+        if created:
+            for group in items.values():
+                self.canvas.tag_raise(group.tag)
+
+    def _draw_timings(self):
+        """ Displays the statistics of the timings in the corner of the canvas
+        """
+        x = self.canvas.canvasx(0) + 10
+        y = self.canvas.canvasy(0) + 10
+
+        if self.canvas_items['timings'].update([[x, y]], [{'text': self.timings.format()}]):
+            self.canvas.tag_raise('timings')
+
+    def _get_view_box(self):
+        """ Returns the part of the canvas to draw: the visible part, and a
+            margin of VIEW_MARGIN around it
+
+            @return: [x_min, y_min, x_max, y_max] -> bounds (in pixels)
+        """
+        width = max(self.canvas.winfo_width(), CANVAS_WIDTH)
+        height = max(self.canvas.winfo_height(), CANVAS_HEIGHT)
+        x = self.canvas.canvasx(0)
+        y = self.canvas.canvasy(0)
+
+        return np.array([
+            x - VIEW_MARGIN, y - VIEW_MARGIN, x + width + VIEW_MARGIN, y + height + VIEW_MARGIN
+        ])
+
+    def _edit_waypoints(self, edit):
+        """ Applies an edit to the waypoints, and records it in the journal
+
+            @param edit: Dictionary describing the edit (see EditJournal)
+        """
+        apply_edit(self.waypoints, edit, self._make_waypoint)
+        self._index_waypoints(edit)
+        self.journal.record(edit)
+        self.update_window('center')
+
+    def _index_waypoints(self, edit=None, undo=False):
+        """ Updates the spatial index of the waypoints after they changed
+
+            Adding or deleting the last waypoint and moving one are handled
+            incrementally, the index is rebuilt for the other changes.
+
+            @param edit: Edit applied to the waypoints (see EditJournal), None
+                         to rebuild the index
+            @param undo: Whether the edit has been reverted
+        """
+        op = None if edit is None else edit['op']
+        added = (op == 'add') != undo
+
+        if op == 'move':
+            self.waypoint_index.update(edit['index'])
+            self.hovered_wp_idx.discard(edit['index'])
+        elif op in ('add', 'delete') and added and edit['index'] == len(self.waypoints) - 1:
+            self.waypoint_index.add(edit['index'])
+        elif op in ('add', 'delete') and not added and edit['index'] == len(self.waypoints):
+            self.waypoint_index.remove(edit['index'])
+            self.hovered_wp_idx.discard(edit['index'])
+        else:
+            self.waypoint_index.rebuild(self.waypoints)
+            self.hovered_wp_idx = set(np.flatnonzero(self.waypoints.hovered).tolist())
+
+    @staticmethod
+    def _make_waypoint(x, y):
+        # Waypoints are inserted in the WaypointSet by their coordinates
+        return [x, y]
+
+    def _get_waypoints_array(self):
+        """ Returns a copy of the (N, 2) array of the waypoints coordinates (in m)
+        """
+        return self.waypoints.coords.copy()
+
+    def _draw_center_line(self, runs, view_box):
         """ Draw the center line
 
-            @param center_points: List of pixel coordinates ready to draw the center line
-                                  [x1, y1, x2, y2, ...]
-            @param curvatures:    Curvatures at each point
+            Each run of segments is drawn as a polyline, red if the curvature
+            exceeds the maximum one, and dashed blue otherwise.
+
+            @param runs:     List of [points, too_sharp] for each run of segments
+                             with the same curvature state (see _lod_stage)
+            @param view_box: Bounds of the part of the canvas to draw
+            @return: Whether canvas items have been created
         """
-        for k in range(len(curvatures)-1):
-            points = center_points[2*k:2*(k+2)]
-            max_curvature = 1.0 / self.turning_radius
+        polylines = []
+        styles = []
 
-            if abs(curvatures[k]) > max_curvature:
-                self.canvas.create_line(points, smooth=True, fill='red', width=2)
-            else:
-                self.canvas.create_line(points, smooth=True, fill='blue', width=1, dash=(5, 10))
+        for points, too_sharp in runs:
+            for part in clip_polyline(points, view_box):
+                polylines.append(part)
+                styles.append(self.SHARP_TURN_STYLE if too_sharp else self.CENTER_LINE_STYLE)
 
+        return self.canvas_items['center'].update(polylines, styles)
 
     def _mouse_motion_cb(self, event):
         """ Callback for any motion of the mouse
@@ -256,30 +674,34 @@ class TrackBuilderGUI(tk.Frame, TrackBuilder, TrackExporter, DistanceConverter):
         pxl_x = event.x + offset_x  # cursor position (in pxl)
         pxl_y = event.y + offset_y
 
-        redraw = False  # whether the window needs to be drawn again
+        stage = None  # pipeline stage to update
 
         if not self.is_dragging:
-            for wp in self.waypoints:
-                redraw = wp.update_hovering(pxl_x, pxl_y) or redraw
+            hovered_wp_idx = set(self.waypoint_index.query(pxl_x, pxl_y))
+
+            changed_wp_idx = list(hovered_wp_idx ^ self.hovered_wp_idx)
+
+            if self.waypoints.update_hovering(pxl_x, pxl_y, changed_wp_idx):
+                stage = 'draw'
+
+            self.hovered_wp_idx = hovered_wp_idx
         else:
-            x = self.pxl_to_m(pxl_x)
-            y = self.pxl_to_m(pxl_y)
+            x, y = self.transform.pxl_to_m([pxl_x, pxl_y]).tolist()
 
             if self.snap_grid or (event.state == 276):
                 x, y = self.snap_coord_to_grid(x, y, self.grid_size)
 
             # Check whether it would collides with another waypoint
-            collision = False
-            for i, wp in enumerate(self.waypoints):
-                if i != self.dragged_wp_idx and wp.is_colliding(self.m_to_pxl(x), self.m_to_pxl(y)):
-                    collision = True
-                    break
+            collision = self.waypoint_index.query(
+                *self.transform.m_to_pxl([x, y]).tolist(), exclude=self.dragged_wp_idx
+            )
             if not collision:
-                self.waypoints[self.dragged_wp_idx].update_position(x, y)
-                redraw = True
+                self.waypoints.move(self.dragged_wp_idx, x, y)
+                self.waypoint_index.update(self.dragged_wp_idx)
+                stage = 'center'
 
-        if redraw:
-            self.update_window()
+        if stage is not None:
+            self.request_update(stage)
 
     def _left_click_cb(self, event):
         """ Callback for the left click
@@ -292,40 +714,45 @@ class TrackBuilderGUI(tk.Frame, TrackBuilder, TrackExporter, DistanceConverter):
         pxl_y = event.y + offset_y
 
         if self.action_state == ADD_STATE:
-            x = self.pxl_to_m(pxl_x)  # cursor position (in m)
-            y = self.pxl_to_m(pxl_y)
+            x, y = self.transform.pxl_to_m([pxl_x, pxl_y]).tolist()  # cursor position (in m)
 
             # Check whether it collides with an already existing waypoint
-            for i, wp in enumerate(self.waypoints):
-                if wp.is_colliding(pxl_x, pxl_y):
-                    self.is_dragging = True
-                    self.dragged_wp_idx = i
-                    return
+            for i in self.waypoint_index.query(pxl_x, pxl_y):
+                wp = self.waypoints[i]
+                self.is_dragging = True
+                self.dragged_wp_idx = i
+                self.drag_start = [wp.x, wp.y]
+                return
 
             # Snaps to grid if necessary, and check that the snapped position is
             # not already taken
             if self.snap_grid:
                 x, y = self.snap_coord_to_grid(x, y, self.grid_size)
-                pxl_x = self.m_to_pxl(x)
-                pxl_y = self.m_to_pxl(y)
+                pxl_x, pxl_y = self.transform.m_to_pxl([x, y]).tolist()
 
-                for i, wp in enumerate(self.waypoints):
-                    if wp.is_colliding(pxl_x, pxl_y):
-                        return
+                if self.waypoint_index.query(pxl_x, pxl_y):
+                    return
 
             # If not, add a new waypoint
-            self.waypoints.append(Waypoint(x, y, WAYPOINTS_RADIUS))
-            self.update_window()
+            self._edit_waypoints({'op': 'add', 'index': len(self.waypoints), 'point': [x, y]})
 
         elif self.action_state == DELETE_STATE:
-            for i, wp in enumerate(self.waypoints):
-                if wp.is_colliding(pxl_x, pxl_y):
-                    del self.waypoints[i]
-                    break
-
-            self.update_window()
+            for i in self.waypoint_index.query(pxl_x, pxl_y):
+                wp = self.waypoints[i]
+                self._edit_waypoints({'op': 'delete', 'index': i, 'point': [wp.x, wp.y]})
+                break
 
     def _left_release_cb(self, event):
+        # Record the whole drag as a single move
+        if self.is_dragging:
+            wp = self.waypoints[self.dragged_wp_idx]
+
+            if [wp.x, wp.y] != self.drag_start:
+                self.journal.record({
+                    'op': 'move', 'index': self.dragged_wp_idx,
+                    'from': self.drag_start, 'to': [wp.x, wp.y]
+                })
+
         self.is_dragging = False
 
     def _ctrl_left_click_cb(self, event):
@@ -333,15 +760,27 @@ class TrackBuilderGUI(tk.Frame, TrackBuilder, TrackExporter, DistanceConverter):
 
     def _mouse_scroll_up_cb(self, event):
         self.canvas.yview_scroll(-1, "units")
+        self.request_update('draw')
 
     def _mouse_scroll_down_cb(self, event):
         self.canvas.yview_scroll(1, "units")
+        self.request_update('draw')
 
     def _mouse_scroll_left_cb(self, event):
         self.canvas.xview_scroll(-1, "units")
+        self.request_update('draw')
 
     def _mouse_scroll_right_cb(self, event):
         self.canvas.xview_scroll(1, "units")
+        self.request_update('draw')
+
+    def _xview_cb(self, *args):
+        self.canvas.xview(*args)
+        self.request_update('draw')
+
+    def _yview_cb(self, *args):
+        self.canvas.yview(*args)
+        self.request_update('draw')
 
     def _add_button_cb(self):
         self.action_state = ADD_STATE
@@ -350,39 +789,110 @@ class TrackBuilderGUI(tk.Frame, TrackBuilder, TrackExporter, DistanceConverter):
         self.action_state = DELETE_STATE
 
     def _delete_last_button_cb(self):
-        if self.waypoints != []:
-            del self.waypoints[-1]
-            self.update_window()
+        if len(self.waypoints) > 0:
+            wp = self.waypoints[-1]
+            self._edit_waypoints(
+                {'op': 'delete', 'index': len(self.waypoints) - 1, 'point': [wp.x, wp.y]}
+            )
 
     def _clear_button_cb(self):
-        self.waypoints = []
-        self.update_window()
+        if len(self.waypoints) > 0:
+            self._edit_waypoints({
+                'op': 'replace', 'old': self._get_waypoints_array().tolist(), 'new': []
+            })
+
+    def _undo_cb(self, event=None):
+        if self.is_dragging:
+            return
+
+        edit = self.journal.undo()
+
+        if edit is not None:
+            apply_edit(self.waypoints, edit, self._make_waypoint, undo=True)
+            self._index_waypoints(edit, undo=True)
+            self.update_window('center')
+
+    def _redo_cb(self, event=None):
+        if self.is_dragging:
+            return
+
+        edit = self.journal.redo()
+
+        if edit is not None:
+            apply_edit(self.waypoints, edit, self._make_waypoint)
+            self._index_waypoints(edit)
+            self.update_window('center')
+
+    def _quit_cb(self):
+        if self.worker is not None:
+            self.worker.stop()
+
+        if self.timings is not None and self.timing_report_path is not None:
+            self.timings.dump(os.path.expanduser(self.timing_report_path))
+        elif self.timings is not None:
+            print(self.timings.format())
+
+        # The session ended normally, its autosave is not needed anymore
+        self.journal.close(remove=True)
+        self.winfo_toplevel().destroy()
 
     def _zoom_out_button_cb(self):
-        DistanceConverter.zoom_out()
-        for p in self.waypoints:
-            p.update_pxl_position()
-        self.update_window()
+        self.transform.zoom_out()
+        self._update_pxl_positions()
 
     def _zoom_in_button_cb(self):
-        DistanceConverter.zoom_in()
-        for p in self.waypoints:
-            p.update_pxl_position()
-        self.update_window()
+        self.transform.zoom_in()
+        self._update_pxl_positions()
+
+    def _update_pxl_positions(self):
+        """ Updates the pixel positions of all the waypoints at once, after the
+            transform of the view changed
+        """
+        self.waypoints.update_pxl_positions()
+        self._index_waypoints()
+        self.update_window('lod')
 
     def _export_button_cb(self):
-        self.export_track(self.cones, self.waypoints, self.initial_pose)
+        self._finish_geometry()  # the cones and pose have to match the current waypoints
+        self.export_track(
+            self.pipeline.outputs['cones'], self._get_waypoints_array(),
+            self.pipeline.outputs['start_pose']
+        )
 
     def _import_button_cb(self):
-        new_waypoints = self.import_track(WAYPOINTS_RADIUS)
+        new_waypoints, cones, initial_pose = self.import_track(WAYPOINTS_RADIUS, self.transform)
 
-        if new_waypoints != []:
-            self.waypoints = new_waypoints
-            self.update_window()
+        if len(new_waypoints) == 0:
+            return
+
+        self.journal.record({
+            'op': 'replace', 'old': self._get_waypoints_array().tolist(),
+            'new': new_waypoints.coords.tolist()
+        })
+        self.waypoints = new_waypoints
+        self._index_waypoints()
+        self.pipeline.invalidate('center')
+
+        # Keep the imported cones and initial pose instead of computing them again
+        cones, initial_pose = self.restore_track(cones, initial_pose)
+
+        if cones is not None:
+            self.pipeline.set_output('cones', cones)
+        if initial_pose is not None:
+            self.pipeline.set_output('start_pose', initial_pose)
+
+        self.update_window()
 
     def _close_loop_cb(self, a, b, c):
         self.close_loop = self.close_loop_var.get()
-        self.update_window()
+        self.update_window('center')
+
+    def _local_interpolation_cb(self, a, b, c):
+        if self.local_interpolation_var.get():
+            self.interpolation = CATMULL_ROM_INTERPOLATION
+        else:
+            self.interpolation = SPLINE_INTERPOLATION
+        self.update_window('center')
 
     def _snap_grid_cb(self, a, b, c):
         self.snap_grid = self.snap_grid_var.get()
@@ -390,14 +900,14 @@ class TrackBuilderGUI(tk.Frame, TrackBuilder, TrackExporter, DistanceConverter):
     def _cones_spacing_cb(self, string_var):
         try:
             self.cones_spacing = float(string_var.get())
-            self.update_window()
+            self.request_update('cones')
         except ValueError:  # catch wrong inputs
             pass
 
     def _orange_spacing_cb(self, string_var):
         try:
             self.orange_spacing = float(string_var.get())
-            self.update_window()
+            self.request_update('cones')
         except ValueError:  # catch wrong inputs
             pass
 
@@ -408,7 +918,7 @@ class TrackBuilderGUI(tk.Frame, TrackBuilder, TrackExporter, DistanceConverter):
             if self.turning_radius == 0.0:
                 self.turning_radius = 1.0
 
-            self.update_window()
+            self.request_update('lod')
         except ValueError:  # catch wrong inputs
             pass
 